@@ -1,5 +1,59 @@
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import Func
+from django.utils import timezone
 from rest_framework import serializers
 
 
 class EmptySerializer(serializers.Serializer):
     pass
+
+
+class Echo:
+    """
+    File-like object returning what is written, lets csv.writer produce rows
+    for a streaming response
+    """
+
+    def write(self, value):
+        return value
+
+
+class WindowSum(Func):
+    """
+    SUM usable inside a Window, including over an aggregate of a grouped query
+    (``SUM(SUM(duration)) OVER ()``), which Django's Sum refuses to nest
+    """
+
+    function = "SUM"
+    window_compatible = True
+
+
+def reserve_ids(model, count):
+    """
+    Draw count primary keys from the sequence of the model's table, so rows
+    needing their id in another column can be inserted with a single query
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+            "FROM generate_series(1, %s)",
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def start_of_day(day):
+    """
+    Aware datetime of the midnight starting the day in the current timezone
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(first_day, last_day):
+    """
+    Half-open [start, end) datetime range covering the days from first_day to
+    last_day inclusive, usable as a plain range lookup on a datetime column
+    """
+    return start_of_day(first_day), start_of_day(last_day + timedelta(days=1))
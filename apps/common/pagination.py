@@ -0,0 +1,195 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.paginator import InvalidPage, Paginator
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor based pagination over an indexed ordering.
+
+    Every page is fetched with a ``WHERE key > cursor LIMIT n`` query, so a deep
+    page costs the same as the first one and no ``COUNT(*)`` is issued.
+    """
+
+    ordering = "id"
+
+
+class KeysetPaginationMixin:
+    """
+    Let clients opt in to keyset pagination on a viewset.
+
+    Keyset pagination is used when the request has ``?pagination=cursor``, the
+    ``X-Pagination: cursor`` header or already carries a ``cursor`` parameter,
+    otherwise the default paginator of the view is kept.
+    """
+
+    keyset_query_param = "pagination"
+    keyset_header = "X-Pagination"
+    keyset_value = "cursor"
+    keyset_ordering = "id"
+
+    def keyset_requested(self):
+        request = getattr(self, "request", None)
+        if request is None:
+            return False
+        return (
+            request.query_params.get(self.keyset_query_param) == self.keyset_value
+            or request.headers.get(self.keyset_header) == self.keyset_value
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def get_keyset_paginator(self):
+        paginator = KeysetPagination()
+        paginator.ordering = self.get_keyset_ordering()
+        return paginator
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.keyset_requested():
+            self._paginator = self.get_keyset_paginator()
+        return super().paginator
+
+
+class CountedPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination for results fetched one page at a time together with
+    their total count (e.g. with ``COUNT(*) OVER ()``) instead of a separate
+    ``COUNT`` query.
+
+    Call ``get_page_bounds`` to get the slice to fetch, then ``set_count`` with
+    the total count before building the paginated response.
+    """
+
+    def get_page_bounds(self, request):
+        """
+        Offset and limit of the requested page
+        """
+        self.request = request
+        page_number = request.query_params.get(self.page_query_param) or 1
+        try:
+            self.page_number = int(page_number)
+        except ValueError:
+            raise self._invalid_page(
+                page_number, _("That page number is not an integer")
+            )
+        if self.page_number < 1:
+            raise self._invalid_page(page_number, _("That page number is less than 1"))
+
+        page_size = self.get_page_size(request)
+        offset = (self.page_number - 1) * page_size
+        return offset, offset + page_size
+
+    def set_count(self, count):
+        paginator = Paginator(range(count), self.get_page_size(self.request))
+        try:
+            self.page = paginator.page(self.page_number)
+        except InvalidPage as exc:
+            raise self._invalid_page(self.page_number, str(exc))
+
+    def _invalid_page(self, page_number, message):
+        return NotFound(
+            self.invalid_page_message.format(page_number=page_number, message=message)
+        )
+
+
+class SearchPagination(CountedPageNumberPagination):
+    """
+    Page number pagination of an Elasticsearch search done by Elasticsearch with
+    ``from``/``size``, the count is the total number of hits it reports.
+
+    Elasticsearch refuses pages past ``max_result_window`` hits, those are
+    reachable with SearchAfterPagination.
+    """
+
+    max_result_window = 10000
+
+    def paginate_search(self, search, request):
+        offset, end = self.get_page_bounds(request)
+        if end > self.max_result_window:
+            raise self._invalid_page(
+                self.page_number,
+                _(
+                    "Use cursor pagination to go past {max_result_window} results"
+                ).format(max_result_window=self.max_result_window),
+            )
+
+        response = search[offset:end].extra(track_total_hits=True).execute()
+        self.set_count(response.hits.total.value)
+        return list(response.hits)
+
+
+class SearchAfterPagination(BasePagination):
+    """
+    Cursor pagination of an Elasticsearch search with ``search_after``, the
+    cursor holds the sort values of the last hit of the page, so any page costs
+    the same as the first one.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = _("Invalid cursor")
+
+    def paginate_search(self, search, request):
+        self.request = request
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            search = search.extra(search_after=self.decode_cursor(encoded))
+
+        response = search.extra(size=self.page_size, track_total_hits=True).execute()
+        hits = list(response.hits)
+        self.count = response.hits.total.value
+        self.next_cursor = None
+        if len(hits) == self.page_size:
+            self.next_cursor = list(hits[-1].meta.sort)
+        return hits
+
+    def decode_cursor(self, encoded):
+        try:
+            search_after = json.loads(urlsafe_b64decode(encoded.encode()))
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(search_after, list):
+            raise NotFound(self.invalid_cursor_message)
+        return search_after
+
+    def encode_cursor(self, search_after):
+        return urlsafe_b64encode(json.dumps(search_after).encode()).decode()
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_cursor)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            {"count": self.count, "next": self.get_next_link(), "results": data}
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["count", "results"],
+            "properties": {
+                "count": {"type": "integer", "example": 123},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
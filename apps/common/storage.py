@@ -0,0 +1,42 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.deconstruct import deconstructible
+from django_minio_backend import MinioBackend
+
+
+@deconstructible
+class CachedUrlMinioBackend(MinioBackend):
+    """
+    MinIO storage caching the presigned download URLs of private buckets.
+
+    URLs are signed as of the start of the current time window, so an object has
+    the same URL for the whole window in every process. Each URL is cached until
+    its window ends and stays valid for at least the URL expiry minus the window.
+    """
+
+    def url(self, name):
+        if self.is_bucket_public:
+            return super().url(name)
+
+        window = settings.PRESIGNED_URL_CACHE_WINDOW
+        now = time.time()
+        window_start = int(now // window * window)
+        digest = hashlib.md5(name.encode()).hexdigest()
+        key = f"presigned-url:{self.bucket}:{window_start}:{digest}"
+
+        url_cache = caches[settings.PRESIGNED_URL_CACHE]
+        url = url_cache.get(key)
+        if url is None:
+            client = self.client if self.same_endpoints else self.client_external
+            url = client.presigned_get_object(
+                bucket_name=self.bucket,
+                object_name=name,
+                expires=settings.MINIO_URL_EXPIRY_HOURS,
+                request_date=datetime.fromtimestamp(window_start, tz=timezone.utc),
+            )
+            url_cache.set(key, url, timeout=window_start + window - now)
+        return url
@@ -0,0 +1,49 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+GLOBAL_SCOPE = "all"
+
+
+def _version_key(scope):
+    return f"reports:version:{scope}"
+
+
+def get_report_version(scope=GLOBAL_SCOPE):
+    """
+    Current version of the reports of a user, or of all users for the global scope
+    """
+    # Versions start from a timestamp so an evicted counter never repeats
+    return cache.get_or_set(_version_key(scope), time.time_ns, timeout=None)
+
+
+def bump_report_version(scope=GLOBAL_SCOPE):
+    key = _version_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_reports(user_ids):
+    """
+    Make cached reports of these users and of all users stale
+    """
+    bump_report_version()
+    for user_id in set(user_ids) - {None}:
+        bump_report_version(user_id)
+
+
+def get_report_cache_key(request_user_id, params):
+    """
+    Cache key of a report for the normalized filter params, scoped to the
+    requesting user and to the version of the time logs the report reads
+    """
+    scope = int(params["user"]) if params.get("user") else GLOBAL_SCOPE
+    version = get_report_version(scope)
+    digest = hashlib.md5(
+        json.dumps(params, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f"reports:{request_user_id}:{scope}:{version}:{digest}"
@@ -1,4 +1,4 @@
-from django_elasticsearch_dsl import Document
+from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
 
 from apps.tasks.models import Task, Comment
@@ -10,9 +10,13 @@ class TaskDocument(Document):
         name = "tasks"
         settings = {"number_of_shards": 1, "number_of_replicas": 0}
 
+    status = fields.KeywordField()
+    executor = fields.IntegerField(attr="executor_id")
+
     class Django:
         model = Task
         fields = [
+            "id",
             "title",
             "description",
         ]
@@ -24,8 +28,12 @@ class CommentDocument(Document):
         name = "comments"
         settings = {"number_of_shards": 1, "number_of_replicas": 0}
 
+    task = fields.IntegerField(attr="task_id")
+
     class Django:
         model = Comment
         fields = [
+            "id",
             "text",
+            "created_at",
         ]
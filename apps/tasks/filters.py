@@ -1,7 +1,10 @@
+from datetime import timedelta
+
 from django.utils import timezone
 from django_filters import rest_framework as filters
 
-from apps.tasks.models import Task, TimeLog
+from apps.common.helpers import day_range, start_of_day
+from apps.tasks.models import AttachmentDailyRollup, Task, TimeLog, TimeLogDailyRollup
 
 
 class TaskFilter(filters.FilterSet):
@@ -14,13 +17,11 @@ class TimeLogFilter(filters.FilterSet):
     user = filters.NumberFilter(field_name="user__id")
     top = filters.NumberFilter(method="filter_top")
     date_from = filters.DateFilter(
-        field_name="end_time__date",
-        lookup_expr="gte",
+        method="filter_date_from",
         help_text="Filter logs from this date (inclusive, format: YYYY-MM-DD)",
     )
     date_to = filters.DateFilter(
-        field_name="end_time__date",
-        lookup_expr="lte",
+        method="filter_date_to",
         help_text="Filter logs until this date (inclusive, format: YYYY-MM-DD)",
     )
 
@@ -34,6 +35,39 @@ class TimeLogFilter(filters.FilterSet):
             self.top = value
         return queryset
 
+    # Dates are compared as timestamp ranges instead of casting end_time to a
+    # date, so the (user, end_time) index can be used
+
+    def filter_date_from(self, queryset, name, value):
+        return queryset.filter(end_time__gte=start_of_day(value))
+
+    def filter_date_to(self, queryset, name, value):
+        return queryset.filter(end_time__lt=start_of_day(value + timedelta(days=1)))
+
+    def filter_current_month(self, queryset, first_day, today):
+        start, end = day_range(first_day, today)
+        return queryset.filter(end_time__gte=start, end_time__lt=end)
+
+    def uses_default_period(self):
+        """
+        Whether no date filters were provided and the current month is used
+        """
+        return not any(key in self.data for key in ["date_from", "date_to"])
+
+    def get_default_period(self):
+        today = timezone.now().date()
+        return today.replace(day=1), today
+
+    def get_normalized_params(self):
+        """
+        Cleaned filter values with the default period resolved, suitable for
+        identifying the filtered result
+        """
+        params = dict(self.form.cleaned_data)
+        if self.uses_default_period():
+            params["date_from"], params["date_to"] = self.get_default_period()
+        return params
+
     def filter_queryset(self, queryset):
         """
         Apply default date filter if no dates specified
@@ -41,11 +75,50 @@ class TimeLogFilter(filters.FilterSet):
         queryset = super().filter_queryset(queryset)
 
         # If no date filters provided, default to current month
-        if not any(key in self.data for key in ["date_from", "date_to"]):
-            today = timezone.now().date()
-            first_day = today.replace(day=1)
-            queryset = queryset.filter(
-                end_time__date__gte=first_day, end_time__date__lte=today
-            )
+        if self.uses_default_period():
+            first_day, today = self.get_default_period()
+            queryset = self.filter_current_month(queryset, first_day, today)
 
         return queryset
+
+
+class TimeLogDailyRollupFilter(TimeLogFilter):
+    """
+    Same parameters as TimeLogFilter, applied to the daily rollup table
+    """
+
+    user = filters.NumberFilter(field_name="user_id")
+    date_from = filters.DateFilter(
+        field_name="day",
+        lookup_expr="gte",
+        help_text="Filter logs from this date (inclusive, format: YYYY-MM-DD)",
+    )
+    date_to = filters.DateFilter(
+        field_name="day",
+        lookup_expr="lte",
+        help_text="Filter logs until this date (inclusive, format: YYYY-MM-DD)",
+    )
+
+    class Meta:
+        model = TimeLogDailyRollup
+        fields = ["user", "date_from", "date_to", "top"]
+
+    def filter_current_month(self, queryset, first_day, today):
+        return queryset.filter(day__gte=first_day, day__lte=today)
+
+
+class AttachmentDailyRollupFilter(filters.FilterSet):
+    date_from = filters.DateFilter(
+        field_name="day",
+        lookup_expr="gte",
+        help_text="Report from this date (inclusive, format: YYYY-MM-DD)",
+    )
+    date_to = filters.DateFilter(
+        field_name="day",
+        lookup_expr="lte",
+        help_text="Report until this date (inclusive, format: YYYY-MM-DD)",
+    )
+
+    class Meta:
+        model = AttachmentDailyRollup
+        fields = ["date_from", "date_to"]
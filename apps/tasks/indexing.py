@@ -0,0 +1,144 @@
+import logging
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import signals
+from django_elasticsearch_dsl.apps import DEDConfig
+from django_elasticsearch_dsl.registries import registry
+from django_elasticsearch_dsl.signals import BaseSignalProcessor
+
+from apps.tasks.models import tasks_bulk_updated
+
+logger = logging.getLogger(__name__)
+
+REINDEX_CACHE_KEY = "search-reindex:{alias}"
+
+
+class PendingDocuments:
+    """
+    Instances changed in a transaction, sent for indexing once it commits with
+    one task message per model
+    """
+
+    def __init__(self):
+        self.pks = defaultdict(set)
+
+    def __call__(self):
+        from apps.tasks.tasks import update_search_index
+
+        for label, pks in self.pks.items():
+            try:
+                update_search_index.delay(label, sorted(pks))
+            except Exception:
+                # The write already committed, rebuilding the index fixes it
+                logger.exception("Could not queue %s documents for indexing", label)
+
+
+def queue_documents(model, pks):
+    """
+    Queue the documents of these instances for indexing once the current
+    transaction commits, repeated changes to an instance are sent once
+    """
+    if not DEDConfig.autosync_enabled() or model not in registry.get_models():
+        return
+
+    pending = get_pending_documents(transaction.get_connection())
+    if pending is not None:
+        pending.pks[model._meta.label].update(pks)
+        return
+
+    # Outside a transaction on_commit calls it right away, so fill it first
+    pending = PendingDocuments()
+    pending.pks[model._meta.label].update(pks)
+    transaction.on_commit(pending)
+
+
+def get_pending_documents(connection):
+    """
+    Batch already waiting for the commit of the current savepoint, it is
+    discarded together with its callback on rollback.
+
+    Django keeps the callbacks as (savepoint_ids, callback, robust) tuples, a
+    layout it does not document. Any other layout only starts a new batch.
+    """
+    savepoint_ids = set(connection.savepoint_ids)
+    for entry in reversed(getattr(connection, "run_on_commit", [])):
+        if not isinstance(entry, tuple) or len(entry) < 2:
+            return None
+        callback_savepoint_ids, callback = entry[:2]
+        if isinstance(callback, PendingDocuments):
+            if callback_savepoint_ids == savepoint_ids:
+                return callback
+            return None
+    return None
+
+
+def get_reindex_target(alias):
+    """
+    Name of the index being built to replace the one behind the alias, if any
+    """
+    return cache.get(REINDEX_CACHE_KEY.format(alias=alias))
+
+
+def set_reindex_target(alias, index_name):
+    key = REINDEX_CACHE_KEY.format(alias=alias)
+    if index_name is None:
+        cache.delete(key)
+    else:
+        cache.set(key, index_name, timeout=None)
+
+
+def index_documents(label, pks):
+    """
+    Index the current state of the instances with a bulk request per document,
+    instances deleted in the meantime are removed from the index.
+
+    Changes are also written to an index being rebuilt so it does not miss the
+    changes made during the rebuild.
+    """
+    model = apps.get_model(label)
+    for document_class in registry.get_documents([model]):
+        document = document_class()
+        instances = list(document.get_queryset().filter(pk__in=pks))
+        deleted_pks = set(pks) - {instance.pk for instance in instances}
+        actions = [
+            *document.get_actions(instances, "index"),
+            *(
+                {"_op_type": "delete", "_index": document._index._name, "_id": pk}
+                for pk in sorted(deleted_pks)
+            ),
+        ]
+        reindex_target = get_reindex_target(document._index._name)
+        if reindex_target:
+            actions += [{**action, "_index": reindex_target} for action in actions]
+        document.bulk(
+            actions, ignore_status=(404,), refresh=document.django.auto_refresh
+        )
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    Signal processor recording changed instances and indexing them from a Celery
+    task after the transaction commits, so writes never wait for Elasticsearch
+    """
+
+    def setup(self):
+        signals.post_save.connect(self.handle_save)
+        signals.post_delete.connect(self.handle_delete)
+        tasks_bulk_updated.connect(self.handle_bulk_update)
+
+    def teardown(self):
+        signals.post_save.disconnect(self.handle_save)
+        signals.post_delete.disconnect(self.handle_delete)
+        tasks_bulk_updated.disconnect(self.handle_bulk_update)
+
+    def handle_save(self, sender, instance, **kwargs):
+        queue_documents(sender, [instance.pk])
+
+    def handle_delete(self, sender, instance, **kwargs):
+        queue_documents(sender, [instance.pk])
+
+    def handle_bulk_update(self, sender, objs, **kwargs):
+        queue_documents(sender, [obj.pk for obj in objs])
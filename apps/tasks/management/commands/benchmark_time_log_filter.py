@@ -0,0 +1,70 @@
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.tasks.filters import TimeLogFilter
+from apps.tasks.models import TimeLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the latency of report queries filtered by casting end_time to a "
+        "date against the timestamp range filters of TimeLogFilter"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date-from",
+            type=date.fromisoformat,
+            help="First day of the report (default: 30 days ago)",
+        )
+        parser.add_argument(
+            "--date-to",
+            type=date.fromisoformat,
+            help="Last day of the report (default: today)",
+        )
+        parser.add_argument("--user", type=int, help="Report only this user id")
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Number of timed runs per query"
+        )
+        parser.add_argument(
+            "--explain", action="store_true", help="Print the query plans"
+        )
+
+    def handle(self, *args, **options):
+        date_to = options["date_to"] or timezone.localdate()
+        date_from = options["date_from"] or date_to - timedelta(days=30)
+
+        # Filtering as done before, with an end_time::date cast
+        before = TimeLog.objects.filter(
+            end_time__date__gte=date_from, end_time__date__lte=date_to
+        )
+        data = {"date_from": date_from, "date_to": date_to}
+        if options["user"]:
+            before = before.filter(user__id=options["user"])
+            data["user"] = options["user"]
+        after = TimeLogFilter(data, queryset=TimeLog.objects.all()).qs
+
+        for label, queryset in [("before", before), ("after", after)]:
+            report = (
+                queryset.values("task_id")
+                .annotate(total_duration=Sum("duration"))
+                .order_by("-total_duration")
+            )
+            timings = []
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                list(report)
+                queryset.aggregate(total_duration=Sum("duration"))
+                timings.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(
+                f"{label}: median {statistics.median(timings):.2f} ms, "
+                f"min {min(timings):.2f} ms, max {max(timings):.2f} ms"
+            )
+            if options["explain"]:
+                self.stdout.write(report.explain(analyze=True))
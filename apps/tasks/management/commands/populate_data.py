@@ -1,5 +1,6 @@
 import random
 from datetime import timedelta
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from faker import Faker
@@ -79,3 +80,6 @@ class Command(BaseCommand):
         # Bulk create time logs
         TimeLog.objects.bulk_create(time_logs)
         self.stdout.write(self.style.SUCCESS("Successfully added 50,000 time logs."))
+
+        # Bulk created time logs bypass the signals maintaining the rollup
+        call_command("rebuild_time_log_rollup")
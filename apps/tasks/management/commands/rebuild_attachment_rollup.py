@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.tasks.models import AttachmentDailyRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily attachment storage rollup from the attachments"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = AttachmentDailyRollup.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Successfully rebuilt {created} rollup rows.")
+        )
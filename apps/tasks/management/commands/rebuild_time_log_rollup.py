@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.tasks.cache import invalidate_reports
+from apps.tasks.models import TimeLogDailyRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily time log rollup from the raw time logs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rollup rows inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = TimeLogDailyRollup.rebuild(batch_size=options["batch_size"])
+            user_ids = TimeLogDailyRollup.objects.values_list("user_id", flat=True)
+            transaction.on_commit(
+                lambda: invalidate_reports(user_ids.distinct().order_by())
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Successfully rebuilt {created} rollup rows.")
+        )
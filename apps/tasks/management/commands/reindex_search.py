@@ -0,0 +1,177 @@
+from itertools import batched
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django_elasticsearch_dsl.registries import registry
+from elasticsearch.helpers import bulk, parallel_bulk
+
+from apps.tasks.indexing import set_reindex_target
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the search indices into new versioned indices and switch their "
+        "aliases to them, search keeps using the old indices until the switch"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--index",
+            nargs="*",
+            dest="indices",
+            help="Names of the indices to rebuild, all of them by default",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of documents sent per bulk request",
+        )
+        parser.add_argument(
+            "--thread-count",
+            type=int,
+            default=4,
+            help="Number of bulk requests sent in parallel",
+        )
+        parser.add_argument(
+            "--keep-old",
+            action="store_true",
+            help="Keep the indices previously behind the aliases",
+        )
+
+    def handle(self, *args, **options):
+        documents = {
+            document._index._name: document for document in registry.get_documents()
+        }
+        indices = options["indices"] or sorted(documents)
+        unknown = set(indices) - set(documents)
+        if unknown:
+            raise CommandError(f"Unknown indices: {', '.join(sorted(unknown))}")
+
+        for alias in indices:
+            document = documents[alias]()
+            index_name, count = self.reindex(document, options)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Successfully indexed {count} documents into {index_name} "
+                    f"behind {alias}."
+                )
+            )
+
+    def reindex(self, document, options):
+        client = document._get_connection()
+        alias = document._index._name
+        index_name = f"{alias}-{timezone.now():%Y%m%d%H%M%S%f}"
+
+        body = document._index.clone(name=index_name).to_dict()
+        client.indices.create(index=index_name, **body)
+        # Neither refresh nor replicate the segments until everything is loaded
+        client.indices.put_settings(
+            index=index_name,
+            settings={"refresh_interval": "-1", "number_of_replicas": 0},
+        )
+
+        # From now on the indexing tasks also write their changes to the new
+        # index, the load only creates documents so it never overwrites them
+        set_reindex_target(alias, index_name)
+        try:
+            loaded_pks = self.load(client, document, index_name, options)
+            deleted = self.remove_deleted(
+                client, document, index_name, loaded_pks, options
+            )
+            count = len(loaded_pks) - deleted
+            client.indices.put_settings(
+                index=index_name,
+                settings={
+                    "refresh_interval": body["settings"].get("refresh_interval"),
+                    "number_of_replicas": body["settings"].get("number_of_replicas"),
+                },
+            )
+            client.indices.refresh(index=index_name)
+            old_indices = self.switch_alias(client, alias, index_name)
+        except Exception:
+            client.indices.delete(index=index_name, ignore_unavailable=True)
+            raise
+        finally:
+            set_reindex_target(alias, None)
+
+        if old_indices and not options["keep_old"]:
+            client.indices.delete(index=",".join(old_indices))
+        return index_name, count
+
+    def load(self, client, document, index_name, options):
+        """
+        Create the documents of all rows in the new index, returns their ids
+        """
+        # The iterator streams the rows through a server-side cursor
+        queryset = document.get_queryset().order_by("pk")
+        instances = queryset.iterator(chunk_size=options["chunk_size"])
+        loaded_pks = []
+
+        # The actions are built here, the bulk threads only send them, so the
+        # rows are read by this thread's connection and not one per thread
+        batch_size = options["chunk_size"] * options["thread_count"]
+        for batch in batched(instances, batch_size):
+            actions = [
+                {**action, "_op_type": "create", "_index": index_name}
+                for action in document.get_actions(batch, "index")
+            ]
+            loaded_pks += [action["_id"] for action in actions]
+            for ok, item in parallel_bulk(
+                client,
+                actions,
+                chunk_size=options["chunk_size"],
+                thread_count=options["thread_count"],
+                raise_on_error=False,
+            ):
+                # A conflict means an indexing task already wrote a newer version
+                if not ok and item["create"]["status"] != 409:
+                    raise CommandError(f"Could not index {item['create']}")
+        return loaded_pks
+
+    def remove_deleted(self, client, document, index_name, loaded_pks, options):
+        """
+        Delete the documents of the rows deleted during the load, the load
+        creates them again when the indexing task removed them before their
+        chunk was sent. Returns how many were deleted
+        """
+        queryset = document.get_queryset()
+        chunk_size = options["chunk_size"]
+        deleted_pks = []
+        for i in range(0, len(loaded_pks), chunk_size):
+            chunk = loaded_pks[i : i + chunk_size]
+            existing_pks = set(
+                queryset.filter(pk__in=chunk).values_list("pk", flat=True)
+            )
+            deleted_pks += [pk for pk in chunk if pk not in existing_pks]
+
+        if deleted_pks:
+            bulk(
+                client,
+                (
+                    {"_op_type": "delete", "_index": index_name, "_id": pk}
+                    for pk in deleted_pks
+                ),
+                chunk_size=chunk_size,
+                ignore_status=(404,),
+            )
+        return len(deleted_pks)
+
+    def switch_alias(self, client, alias, index_name):
+        """
+        Point the alias to the new index in one atomic update, returns the
+        indices it pointed to
+        """
+        actions = [{"add": {"index": index_name, "alias": alias}}]
+        old_indices = []
+        if client.indices.exists_alias(name=alias):
+            old_indices = sorted(client.indices.get_alias(name=alias))
+            actions = [
+                {"remove": {"index": old_index, "alias": alias}}
+                for old_index in old_indices
+            ] + actions
+        elif client.indices.exists(index=alias):
+            # Indices created before aliases were used are dropped by the switch
+            actions.insert(0, {"remove_index": {"index": alias}})
+        client.indices.update_aliases(actions=actions)
+        return old_indices
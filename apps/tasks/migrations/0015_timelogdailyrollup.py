@@ -0,0 +1,91 @@
+# Generated by Django 5.1.1 on 2026-10-17 03:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollup(apps, schema_editor):
+    TimeLog = apps.get_model("tasks", "TimeLog")
+    TimeLogDailyRollup = apps.get_model("tasks", "TimeLogDailyRollup")
+    totals = (
+        TimeLog.objects.filter(duration__isnull=False)
+        .annotate(day=TruncDate("end_time"))
+        .values("day", "user_id", "task_id")
+        .annotate(total_duration=Sum("duration"))
+        .order_by()
+    )
+    TimeLogDailyRollup.objects.bulk_create(
+        (
+            TimeLogDailyRollup(
+                day=total["day"],
+                user_id=total["user_id"],
+                task_id=total["task_id"],
+                duration=total["total_duration"],
+            )
+            for total in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0014_attachment_size"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="attachment",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name="TimeLogDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("duration", models.DurationField()),
+                (
+                    "task",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="time_log_rollups",
+                        to="tasks.task",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="time_log_rollups",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "user", "task"),
+                        name="unique_time_log_daily_rollup",
+                        nulls_distinct=False,
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-17 03:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0015_timelogdailyrollup"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="timelog",
+            index=models.Index(
+                fields=["user", "end_time"],
+                include=("duration",),
+                name="timelog_user_end_time_idx",
+            ),
+        ),
+    ]
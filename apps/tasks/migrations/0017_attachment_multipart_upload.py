@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-17 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0016_timelog_user_end_time_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attachment",
+            name="part_size",
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="attachment",
+            name="parts_count",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="attachment",
+            name="upload_id",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="attachment",
+            name="uploaded_parts",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name="attachment",
+            name="size",
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
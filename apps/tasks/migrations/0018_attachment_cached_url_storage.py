@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-17 04:10
+
+import apps.common.storage
+import apps.tasks.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0017_attachment_multipart_upload"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="attachment",
+            name="file",
+            field=models.FileField(
+                storage=apps.common.storage.CachedUrlMinioBackend(bucket_name="media"),
+                upload_to=apps.tasks.models.Attachment.custom_file_name,
+            ),
+        ),
+    ]
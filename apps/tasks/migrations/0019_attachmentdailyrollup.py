@@ -0,0 +1,48 @@
+# Generated by Django 5.1.1 on 2026-10-17 04:12
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def populate_rollup(apps, schema_editor):
+    Attachment = apps.get_model("tasks", "Attachment")
+    AttachmentDailyRollup = apps.get_model("tasks", "AttachmentDailyRollup")
+    totals = (
+        Attachment.objects.filter(status="Uploaded")
+        .annotate(day=TruncDate("created_at"))
+        .values("day")
+        .annotate(files=Count("id"), total_size=Coalesce(Sum("size"), 0))
+        .order_by()
+    )
+    AttachmentDailyRollup.objects.bulk_create(
+        (AttachmentDailyRollup(**total) for total in totals.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0018_attachment_cached_url_storage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AttachmentDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True)),
+                ("files", models.IntegerField(default=0)),
+                ("total_size", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
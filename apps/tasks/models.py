@@ -1,10 +1,65 @@
-from django.db import models
-from django.db.models import Sum, DurationField, ExpressionWrapper, F
+import re
+
+from django.db import connection, models, transaction
+from django.db.models import (
+    Count,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+)
+from django.db.models.functions import Coalesce, TruncDate
+from django.dispatch import Signal
 from django.utils import timezone
-from django_minio_backend import MinioBackend
 
+from apps.common.helpers import day_range
+from apps.common.storage import CachedUrlMinioBackend
 from apps.users.models import User
 
+# Sent with the tasks saved by TaskQuerySet.bulk_update(), which sends no
+# post_save, so their changes are still notified and indexed
+tasks_bulk_updated = Signal()
+
+
+class TaskQuerySet(models.QuerySet):
+    def with_logged_time(self):
+        """
+        Annotate each task with the sum of its time log durations
+        """
+        return self.annotate(logged_duration=Sum("time_logs__duration"))
+
+    def with_related_counts(self):
+        """
+        Annotate each task with the number of its attachments, comments and
+        time logs, using correlated subqueries so the counts are not inflated
+        by other joins
+        """
+
+        def count_subquery(model):
+            counts = (
+                model.objects.filter(task=OuterRef("pk"))
+                .order_by()
+                .values("task")
+                .annotate(count=Count("pk"))
+                .values("count")
+            )
+            return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+        return self.annotate(
+            attachments_count=count_subquery(Attachment),
+            comments_count=count_subquery(Comment),
+            time_logs_count=count_subquery(TimeLog),
+        )
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        tasks_bulk_updated.send(sender=self.model, objs=objs, fields=fields)
+        return rows
+
 
 class Task(models.Model):
     STATUS_CHOICES = [
@@ -35,14 +90,33 @@ class Task(models.Model):
         db_index=True,
     )
 
+    objects = TaskQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the executor and status the task had when loaded, to notify
+        # their changes without loading it again
+        if not {"executor_id", "status"} & instance.get_deferred_fields():
+            instance._loaded_executor_id = instance.executor_id
+            instance._loaded_status = instance.status
+        # And its title, shown by the cached reports
+        if "title" not in instance.get_deferred_fields():
+            instance._loaded_title = instance.title
+        return instance
+
     @property
     def logged_time(self) -> int:
-        total_duration = self.time_logs.aggregate(
-            total_duration=Sum(
-                ExpressionWrapper(F("duration"), output_field=DurationField())
-            )
-        )["total_duration"]
-        return total_duration.total_seconds() // 60 if total_duration else 0
+        # Prefer the value annotated by TaskQuerySet.with_logged_time()
+        if hasattr(self, "logged_duration"):
+            total_duration = self.logged_duration
+        else:
+            total_duration = self.time_logs.aggregate(
+                total_duration=Sum(
+                    ExpressionWrapper(F("duration"), output_field=DurationField())
+                )
+            )["total_duration"]
+        return int(total_duration.total_seconds() // 60) if total_duration else 0
 
     def __str__(self):
         return self.title
@@ -86,10 +160,136 @@ class TimeLog(models.Model):
         blank=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "end_time"],
+                include=["duration"],
+                name="timelog_user_end_time_idx",
+            )
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the rollup row the log counted towards when it was loaded
+        if not {"end_time", "user_id", "task_id"} & instance.get_deferred_fields():
+            instance._loaded_rollup_key = instance.rollup_key
+        return instance
+
+    @property
+    def rollup_key(self):
+        """
+        The (day, user_id, task_id) of the daily rollup row this log counts towards
+        """
+        end_time = self._meta.get_field("end_time").to_python(self.end_time)
+        if end_time is None:
+            return None
+        return timezone.localdate(end_time), self.user_id, self.task_id
+
     def __str__(self):
         return f"{self.user} - {self.task.title} on {self.start_time}"
 
 
+class TimeLogDailyRollup(models.Model):
+    """
+    Total logged time per day, user and task, maintained from TimeLog writes
+    """
+
+    day = models.DateField()
+    # Rows of a deleted user or task go with it, the signals count its logs
+    # again in the rows without user or task
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name="time_log_rollups",
+    )
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name="time_log_rollups",
+    )
+    duration = models.DurationField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "user", "task"],
+                name="unique_time_log_daily_rollup",
+                nulls_distinct=False,
+            )
+        ]
+
+    @classmethod
+    def refresh(cls, day, user_id, task_id):
+        """
+        Recompute a single rollup row from the raw time logs.
+
+        Refreshes of the same row take turns until the end of their transaction,
+        so each one aggregates after the logs of the previous one committed and
+        a stale total never overwrites a newer one.
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(hashtext(%s))",
+                    [f"{cls._meta.db_table}:{day}:{user_id}:{task_id}"],
+                )
+
+            start, end = day_range(day, day)
+            total_duration = TimeLog.objects.filter(
+                user_id=user_id, task_id=task_id, end_time__gte=start, end_time__lt=end
+            ).aggregate(total_duration=Sum("duration"))["total_duration"]
+
+            if total_duration is None:
+                cls.objects.filter(day=day, user_id=user_id, task_id=task_id).delete()
+                return
+
+            cls.objects.update_or_create(
+                day=day,
+                user_id=user_id,
+                task_id=task_id,
+                defaults={"duration": total_duration},
+            )
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """
+        Replace all rollup rows with totals aggregated from the raw time logs
+        """
+        cls.objects.all().delete()
+        totals = (
+            TimeLog.objects.filter(duration__isnull=False)
+            .annotate(day=TruncDate("end_time"))
+            .values("day", "user_id", "task_id")
+            .annotate(total_duration=Sum("duration"))
+            .order_by()
+        )
+
+        created = 0
+        batch = []
+        for total in totals.iterator(chunk_size=batch_size):
+            batch.append(
+                cls(
+                    day=total["day"],
+                    user_id=total["user_id"],
+                    task_id=total["task_id"],
+                    duration=total["total_duration"],
+                )
+            )
+            if len(batch) == batch_size:
+                created += len(cls.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            created += len(cls.objects.bulk_create(batch))
+        return created
+
+    def __str__(self):
+        return f"{self.user} - {self.task_id} on {self.day}"
+
+
 class Attachment(models.Model):
     STATUS_CHOICES = [
         ("Pending", "Pending Upload"),
@@ -97,20 +297,265 @@ class Attachment(models.Model):
         ("Failed", "Failed"),
     ]
 
+    # Object names produced by custom_file_name
+    OBJECT_NAME_RE = re.compile(r"^task_(?P<task_id>\d+)/(?P<attachment_id>\d+)_")
+
     def custom_file_name(instance, filename):
         return f"task_{instance.task_id}/{instance.id}_{filename}"
 
+    @classmethod
+    def parse_object_name(cls, object_name):
+        """
+        Task and attachment ids encoded in an object name, or None if the name
+        was not produced by custom_file_name
+        """
+        match = cls.OBJECT_NAME_RE.match(object_name)
+        if match is None:
+            return None
+        return int(match["task_id"]), int(match["attachment_id"])
+
+    @classmethod
+    def mark_uploaded(cls, uploads):
+        """
+        Mark the attachments of (object name, size) pairs as uploaded with a
+        single ``UPDATE ... FROM (VALUES ...)``, returns the number of matched
+        attachments
+
+        The status and sizes are absolute values, so replayed events are harmless.
+        """
+        rows = []
+        for object_name, size in uploads:
+            ids = cls.parse_object_name(object_name)
+            if ids is not None:
+                task_id, attachment_id = ids
+                rows.append((attachment_id, task_id, object_name, size))
+        return cls.apply_uploads(rows)
+
+    @classmethod
+    def apply_uploads(cls, rows):
+        """
+        Mark the attachments of (id, task id, object name, size) rows as uploaded
+        and add them to the storage rollup in a single statement, returns the
+        number of matched attachments
+        """
+        # One row per attachment, the last one wins
+        rows = list({row[0]: row for row in rows}.values())
+        if not rows:
+            return 0
+
+        quote = connection.ops.quote_name
+        table = quote(cls._meta.db_table)
+        pk, task, file, status, size, upload_id, created_at = (
+            quote(cls._meta.get_field(name).column)
+            for name in [
+                "id",
+                "task",
+                "file",
+                "status",
+                "size",
+                "upload_id",
+                "created_at",
+            ]
+        )
+        values = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+        rollup_sql, rollup_params = AttachmentDailyRollup.upsert_sql("changes")
+        # The previous state is read under lock, already uploaded attachments
+        # only change the rollup by their size difference
+        sql = (
+            f"WITH uploads (id, task_id, file, size) AS (VALUES {values}), "
+            f"previous AS ("
+            f"SELECT attachment.{pk} AS id, attachment.{status} AS status, "
+            f"attachment.{size} AS size "
+            f"FROM {table} AS attachment JOIN uploads "
+            f"ON attachment.{pk} = uploads.id "
+            f"AND attachment.{task} = uploads.task_id "
+            f"AND attachment.{file} = uploads.file "
+            f"FOR UPDATE OF attachment), "
+            f"updated AS ("
+            f"UPDATE {table} AS attachment "
+            f"SET {status} = %s, {size} = uploads.size::bigint, {upload_id} = '' "
+            f"FROM uploads, previous "
+            f"WHERE attachment.{pk} = previous.id AND uploads.id = previous.id "
+            f"RETURNING attachment.{created_at} AS created_at, "
+            f"previous.status AS previous_status, previous.size AS previous_size, "
+            f"attachment.{size} AS size), "
+            f"changes AS ("
+            f"SELECT created_at, "
+            f"CASE WHEN previous_status = %s THEN 0 ELSE 1 END AS files, "
+            f"COALESCE(size, 0) - CASE WHEN previous_status = %s "
+            f"THEN COALESCE(previous_size, 0) ELSE 0 END AS size "
+            f"FROM updated), "
+            f"rollup AS ({rollup_sql}) "
+            f"SELECT COUNT(*) FROM updated"
+        )
+        params = [
+            *(value for row in rows for value in row),
+            "Uploaded",
+            "Uploaded",
+            "Uploaded",
+            *rollup_params,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="attachments")
     file = models.FileField(
-        storage=MinioBackend(bucket_name="media"), upload_to=custom_file_name
+        storage=CachedUrlMinioBackend(bucket_name="media"), upload_to=custom_file_name
     )
     status = models.CharField(
         max_length=20, choices=STATUS_CHOICES, default="Pending Upload"
     )
     name = models.CharField(max_length=200, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
-    size = models.PositiveIntegerField(null=True, blank=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    # Multipart upload in progress, the upload id is cleared once completed
+    upload_id = models.CharField(max_length=255, blank=True)
+    part_size = models.PositiveBigIntegerField(null=True, blank=True)
+    parts_count = models.PositiveIntegerField(null=True, blank=True)
+    # Part number to ETag of the parts reported as uploaded
+    uploaded_parts = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"Attachment for {self.task.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the attachment counted for in the rollup when loaded
+        if not {"status", "size", "created_at"} & instance.get_deferred_fields():
+            instance._loaded_rollup_change = instance.rollup_change
+        return instance
+
+    @property
+    def rollup_change(self):
+        """
+        The (created at, files, size) the attachment adds to the storage rollup
+        """
+        if self.status != "Uploaded":
+            return None
+        created_at = self._meta.get_field("created_at").to_python(self.created_at)
+        return created_at, 1, self.size or 0
+
+    @property
+    def missing_parts(self):
+        if not self.parts_count:
+            return []
+        return [
+            part_number
+            for part_number in range(1, self.parts_count + 1)
+            if str(part_number) not in self.uploaded_parts
+        ]
+
+
+class AttachmentDailyRollup(models.Model):
+    """
+    Number and total size of the uploaded attachments per day of creation,
+    maintained when attachments are marked uploaded or deleted
+    """
+
+    day = models.DateField(unique=True)
+    files = models.IntegerField(default=0)
+    total_size = models.BigIntegerField(default=0)
+
+    @classmethod
+    def upsert_sql(cls, changes):
+        """
+        INSERT adding the (created_at, files, size) rows of the changes relation
+        to the rollup rows of their days
+        """
+        quote = connection.ops.quote_name
+        table = quote(cls._meta.db_table)
+        day, files, total_size = (
+            quote(cls._meta.get_field(name).column)
+            for name in ["day", "files", "total_size"]
+        )
+        sql = (
+            f"INSERT INTO {table} ({day}, {files}, {total_size}) "
+            f"SELECT (created_at AT TIME ZONE %s)::date, SUM(files), SUM(size) "
+            f"FROM {changes} GROUP BY 1 HAVING SUM(files) <> 0 OR SUM(size) <> 0 "
+            f"ON CONFLICT ({day}) DO UPDATE SET "
+            f"{files} = {table}.{files} + EXCLUDED.{files}, "
+            f"{total_size} = {table}.{total_size} + EXCLUDED.{total_size}"
+        )
+        return sql, [timezone.get_current_timezone_name()]
+
+    @classmethod
+    def apply_changes(cls, changes):
+        """
+        Add (created at, files, size) changes to the rows of their days
+        """
+        if not changes:
+            return
+
+        values = ", ".join(
+            ["(%s::timestamptz, %s::integer, %s::bigint)"] * len(changes)
+        )
+        rollup_sql, rollup_params = cls.upsert_sql("changes")
+        sql = (
+            f"WITH changes (created_at, files, size) AS (VALUES {values}) {rollup_sql}"
+        )
+        params = [*(value for change in changes for value in change), *rollup_params]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Replace all rollup rows with totals aggregated from the attachments
+        """
+        cls.objects.all().delete()
+        totals = (
+            Attachment.objects.filter(status="Uploaded")
+            .annotate(day=TruncDate("created_at"))
+            .values("day")
+            .annotate(files=Count("id"), total_size=Coalesce(Sum("size"), 0))
+            .order_by()
+        )
+        return len(cls.objects.bulk_create(cls(**total) for total in totals))
+
+    def __str__(self):
+        return f"{self.files} attachments on {self.day}"
+
+
+class Notification(models.Model):
+    """
+    Outbox of the emails to send, written in the same transaction as the change
+    and sent as a digest per recipient by the flush_notifications task
+    """
+
+    KIND_ASSIGNED = "assigned"
+    KIND_COMMENTED = "commented"
+    KIND_COMPLETED = "completed"
+    KIND_CHOICES = [
+        (KIND_ASSIGNED, "Task assigned"),
+        (KIND_COMMENTED, "Task commented"),
+        (KIND_COMPLETED, "Task completed"),
+    ]
+
+    recipient = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="notifications"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    task = models.ForeignKey(
+        Task, on_delete=models.CASCADE, related_name="notifications"
+    )
+    actor = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    text = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["recipient", "created_at"],
+                condition=models.Q(sent_at__isnull=True),
+                name="notification_pending_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.recipient}"
@@ -0,0 +1,73 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from minio.datatypes import Part
+
+# S3 limits on the number of parts and the size of an object
+MULTIPART_MAX_PARTS = 10000
+MULTIPART_MAX_SIZE = 5 * 1024**4
+
+# Parts are multiples of this size, S3 needs at least 5 MiB but for the last one
+MULTIPART_PART_SIZE = 64 * 1024 * 1024
+MULTIPART_URL_EXPIRES = timedelta(hours=6)
+
+# The minio client only exposes the multipart API through private methods, they
+# are wrapped here so the rest of the app does not depend on them
+
+
+def get_part_size(size):
+    """
+    Part size to upload a file of this size in at most MULTIPART_MAX_PARTS parts
+    """
+    min_part_size = math.ceil(size / MULTIPART_MAX_PARTS)
+    parts = math.ceil(min_part_size / MULTIPART_PART_SIZE)
+    return max(parts, 1) * MULTIPART_PART_SIZE
+
+
+def create_upload(object_name):
+    """
+    Start a multipart upload of the object, returns its upload id
+    """
+    return default_storage.client._create_multipart_upload(
+        settings.MINIO_MEDIA_FILES_BUCKET, object_name, {}
+    )
+
+
+def presign_part(object_name, upload_id, part_number):
+    """
+    Presigned PUT URL uploading one part, signed locally
+    """
+    return default_storage.client.get_presigned_url(
+        "PUT",
+        settings.MINIO_MEDIA_FILES_BUCKET,
+        object_name,
+        expires=MULTIPART_URL_EXPIRES,
+        extra_query_params={"partNumber": str(part_number), "uploadId": upload_id},
+    )
+
+
+def complete_upload(object_name, upload_id, parts):
+    """
+    Assemble the object from the {part number: etag} parts
+    """
+    return default_storage.client._complete_multipart_upload(
+        settings.MINIO_MEDIA_FILES_BUCKET,
+        object_name,
+        upload_id,
+        [Part(int(number), etag) for number, etag in sorted_parts(parts)],
+    )
+
+
+def abort_upload(object_name, upload_id):
+    """
+    Drop a multipart upload and the parts already uploaded
+    """
+    default_storage.client._abort_multipart_upload(
+        settings.MINIO_MEDIA_FILES_BUCKET, object_name, upload_id
+    )
+
+
+def sorted_parts(parts):
+    return sorted(parts.items(), key=lambda part: int(part[0]))
@@ -0,0 +1,85 @@
+from apps.tasks.models import Comment, Notification, Task
+
+STATUS_COMPLETED = "completed"
+
+
+def notify_task_changes(tasks, created=False):
+    """
+    Add the executor and status changes of the tasks since they were loaded to
+    the notification outbox
+    """
+    notifications = []
+    completed = {}
+    for task in tasks:
+        if created:
+            loaded_executor_id, loaded_status = None, None
+        else:
+            # Tasks not loaded from the database have nothing to compare to
+            loaded_executor_id = getattr(task, "_loaded_executor_id", task.executor_id)
+            loaded_status = getattr(task, "_loaded_status", task.status)
+
+        if task.executor_id and task.executor_id != loaded_executor_id:
+            notifications.append(
+                Notification(
+                    recipient_id=task.executor_id,
+                    kind=Notification.KIND_ASSIGNED,
+                    task=task,
+                )
+            )
+        if (
+            not created
+            and loaded_status != STATUS_COMPLETED
+            and task.status == STATUS_COMPLETED
+        ):
+            completed[task.pk] = task
+
+        task._loaded_executor_id = task.executor_id
+        task._loaded_status = task.status
+
+    if completed:
+        # Tell the commenters of the completed tasks
+        commenters = (
+            Comment.objects.filter(task__in=completed, user__isnull=False)
+            .values_list("task_id", "user_id")
+            .distinct()
+            .order_by("task_id", "user_id")
+        )
+        notifications += [
+            Notification(
+                recipient_id=user_id,
+                kind=Notification.KIND_COMPLETED,
+                task=completed[task_id],
+            )
+            for task_id, user_id in commenters
+        ]
+
+    Notification.objects.bulk_create(notifications)
+
+
+def notify_comments(comments):
+    """
+    Add the new comments to the notification outbox of the executors of their
+    tasks, the tasks not loaded along with the comments are read in one query
+    """
+    executor_ids = {
+        comment.task_id: comment.task.executor_id
+        for comment in comments
+        if Comment.task.is_cached(comment)
+    }
+    missing_ids = {comment.task_id for comment in comments} - executor_ids.keys()
+    if missing_ids:
+        executor_ids.update(
+            Task.objects.filter(pk__in=missing_ids).values_list("pk", "executor_id")
+        )
+
+    Notification.objects.bulk_create(
+        Notification(
+            recipient_id=executor_ids[comment.task_id],
+            kind=Notification.KIND_COMMENTED,
+            task_id=comment.task_id,
+            actor_id=comment.user_id,
+            text=comment.text,
+        )
+        for comment in comments
+        if executor_ids.get(comment.task_id)
+    )
@@ -1,11 +1,64 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 
 from apps.tasks.models import Task, Comment, TimeLog, Attachment
+from apps.tasks.multipart import MULTIPART_MAX_PARTS, MULTIPART_MAX_SIZE
 from apps.users.models import User
 from apps.users.serializers import UserSerializer
 
 
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field using the instances BulkListSerializer loaded for all the
+    items, keys it did not find are looked up as usual to report the error
+    """
+
+    def to_internal_value(self, data):
+        instances = getattr(self.parent, "bulk_instances", {}).get(self.field_name)
+        if instances and not isinstance(data, bool) and str(data) in instances:
+            return instances[str(data)]
+        return super().to_internal_value(data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    List serializer loading the instances of the BulkPrimaryKeyRelatedField
+    fields of all the items with one query per field, instead of one per item
+    """
+
+    def to_internal_value(self, data):
+        self.child.bulk_instances = {}
+        if isinstance(data, list):
+            for name, field in self.child.fields.items():
+                if (
+                    isinstance(field, BulkPrimaryKeyRelatedField)
+                    and not field.read_only
+                ):
+                    self.child.bulk_instances[name] = self._load_instances(
+                        field,
+                        [item.get(name) for item in data if isinstance(item, dict)],
+                    )
+        try:
+            return super().to_internal_value(data)
+        finally:
+            del self.child.bulk_instances
+
+    def _load_instances(self, field, values):
+        queryset = field.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = set()
+        for value in values:
+            if value is None or isinstance(value, bool):
+                continue
+            try:
+                pks.add(pk_field.to_python(value))
+            except DjangoValidationError:
+                continue
+        return {str(pk): instance for pk, instance in queryset.in_bulk(pks).items()}
+
+
 class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
@@ -14,7 +67,7 @@ class TaskSerializer(serializers.ModelSerializer):
 
 class TaskCreateSerializer(serializers.ModelSerializer):
     owner = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    executor = serializers.PrimaryKeyRelatedField(
+    executor = BulkPrimaryKeyRelatedField(
         queryset=User.objects.all(),
         default=serializers.CurrentUserDefault(),
         required=False,
@@ -24,6 +77,7 @@ class TaskCreateSerializer(serializers.ModelSerializer):
         model = Task
         fields = "__all__"
         read_only_fields = ["status"]
+        list_serializer_class = BulkListSerializer
 
 
 class TaskListSerializer(serializers.ModelSerializer):
@@ -34,14 +88,21 @@ class TaskListSerializer(serializers.ModelSerializer):
 
 class TaskUpdateSerializer(serializers.ModelSerializer):
     status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
-    executor = serializers.PrimaryKeyRelatedField(
-        queryset=User.objects.all(), required=False
-    )
+    executor = BulkPrimaryKeyRelatedField(queryset=User.objects.all(), required=False)
 
     class Meta:
         model = Task
         fields = ["id", "title", "executor", "status"]
         read_only_fields = ["id", "title"]
+        list_serializer_class = BulkListSerializer
+
+
+class TaskBulkUpdateSerializer(TaskUpdateSerializer):
+    """
+    Update of one of the tasks changed in bulk, identified by its id
+    """
+
+    id = serializers.IntegerField()
 
 
 class CommentCreateSerializer(serializers.ModelSerializer):
@@ -110,6 +171,22 @@ class ReportSerializer(serializers.Serializer):
     tasks = ReportTaskListSerializer(many=True)
 
 
+class TimeLogExportSerializer(serializers.Serializer):
+    """
+    Describes an exported row, rows are streamed without going through it
+    """
+
+    id = serializers.IntegerField()
+    task = serializers.IntegerField(allow_null=True)
+    task_title = serializers.CharField(allow_null=True)
+    user = serializers.IntegerField(allow_null=True)
+    user_email = serializers.EmailField(allow_null=True)
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField(allow_null=True)
+    logged_time = serializers.IntegerField(allow_null=True)
+    note = serializers.CharField(allow_null=True)
+
+
 class AttachmentSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
@@ -119,6 +196,46 @@ class AttachmentSerializer(serializers.ModelSerializer):
         read_only_fields = ["status", "user", "file", "id"]
 
 
+class MultipartUploadSerializer(serializers.ModelSerializer):
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    size = serializers.IntegerField(
+        min_value=1, max_value=MULTIPART_MAX_SIZE, write_only=True
+    )
+    missing_parts = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True
+    )
+
+    class Meta:
+        model = Attachment
+        fields = [
+            "id",
+            "name",
+            "status",
+            "user",
+            "file",
+            "size",
+            "upload_id",
+            "part_size",
+            "parts_count",
+            "uploaded_parts",
+            "missing_parts",
+        ]
+        read_only_fields = [
+            "id",
+            "status",
+            "file",
+            "upload_id",
+            "part_size",
+            "parts_count",
+            "uploaded_parts",
+        ]
+
+
+class MultipartPartSerializer(serializers.Serializer):
+    part_number = serializers.IntegerField(min_value=1, max_value=MULTIPART_MAX_PARTS)
+    etag = serializers.CharField(max_length=255)
+
+
 class TaskDocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
@@ -131,20 +248,89 @@ class CommentDocumentSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class TaskSearchResultSerializer(serializers.Serializer):
+    """
+    Task search hit served from the fields stored in Elasticsearch
+    """
+
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES)
+    executor = serializers.IntegerField(allow_null=True)
+    highlight = serializers.DictField(child=serializers.ListField())
+
+
+class CommentSearchResultSerializer(serializers.Serializer):
+    """
+    Comment search hit served from the fields stored in Elasticsearch
+    """
+
+    id = serializers.IntegerField()
+    task = serializers.IntegerField()
+    text = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    highlight = serializers.DictField(child=serializers.ListField())
+
+
 class TaskDetailSerializer(serializers.ModelSerializer):
+    """
+    Task details with only the latest attachments, comments and time logs
+    embedded, the full collections are served by the task sub-routes
+    """
+
     owner = UserSerializer(read_only=True)
     executor = UserSerializer(read_only=True)
     logged_time = serializers.IntegerField(read_only=True)
-    attachments = AttachmentSerializer(many=True, read_only=True)
-    comments = CommentListSerializer(many=True, read_only=True)
-    time_logs = TimeLogListSerializer(many=True, read_only=True)
+    attachments = AttachmentSerializer(
+        source="latest_attachments", many=True, read_only=True
+    )
+    comments = CommentListSerializer(
+        source="latest_comments", many=True, read_only=True
+    )
+    time_logs = TimeLogListSerializer(
+        source="latest_time_logs", many=True, read_only=True
+    )
+    attachments_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
+    time_logs_count = serializers.IntegerField(read_only=True)
+    attachments_next = serializers.SerializerMethodField()
+    comments_next = serializers.SerializerMethodField()
+    time_logs_next = serializers.SerializerMethodField()
 
     class Meta:
         model = Task
         fields = "__all__"
 
+    def _get_next_link(self, obj, collection, url_name):
+        """
+        Link to the sub-route of a collection if not all its items are embedded
+        """
+        embedded = getattr(obj, f"latest_{collection}")
+        if getattr(obj, f"{collection}_count") <= len(embedded):
+            return None
+        return reverse(
+            url_name, kwargs={"pk": obj.pk}, request=self.context.get("request")
+        )
+
+    def get_attachments_next(self, obj) -> str | None:
+        return self._get_next_link(obj, "attachments", "tasks-attachments")
+
+    def get_comments_next(self, obj) -> str | None:
+        return self._get_next_link(obj, "comments", "tasks-comments")
+
+    def get_time_logs_next(self, obj) -> str | None:
+        return self._get_next_link(obj, "time_logs", "tasks-logs")
+
 
 class AttachmentReportSerializer(serializers.Serializer):
-    day = serializers.DateField()
-    files = serializers.IntegerField()
-    total_size = serializers.IntegerField()
+    day = serializers.DateField(help_text="Day the attachments were created")
+    total_files = serializers.IntegerField(
+        source="files", help_text="Number of uploaded attachments"
+    )
+    total_size = serializers.IntegerField(help_text="Total size in bytes")
+    total_volume_kb = serializers.SerializerMethodField(
+        help_text="Total size in kilobytes, rounded down"
+    )
+
+    def get_total_volume_kb(self, obj) -> int:
+        return obj.total_size // 1024
@@ -1,58 +1,135 @@
-from django.db.models.signals import post_save, pre_save
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from apps.tasks.models import Task, Comment
-from apps.tasks.tasks import (
-    send_task_assigned_email,
-    send_task_commented_email,
-    send_task_completed_email,
+from apps.tasks.cache import invalidate_reports
+from apps.tasks.models import (
+    Task,
+    Comment,
+    TimeLog,
+    TimeLogDailyRollup,
+    Attachment,
+    AttachmentDailyRollup,
+    tasks_bulk_updated,
 )
+from apps.tasks.notifications import notify_comments, notify_task_changes
+from apps.users.models import User
 
-STATUS_COMPLETED = "completed"
 
+@receiver(post_save, sender=Task)
+def send_task_notifications(sender, instance, created, raw, **kwargs):
+    # Loading fixtures notifies nobody
+    if not raw:
+        notify_task_changes([instance], created=created)
 
-@receiver(pre_save, sender=Task)
-def capture_old_task_state(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            old_task = Task.objects.get(pk=instance.pk)
-            instance._old_executor = old_task.executor
-            instance._old_status = old_task.status
-        except Task.DoesNotExist:
-            pass
 
+@receiver(tasks_bulk_updated, sender=Task)
+def send_bulk_task_notifications(sender, objs, **kwargs):
+    notify_task_changes(objs)
 
-@receiver(post_save, sender=Task)
-def send_task_assigned_notification(sender, instance, created, **kwargs):
-    if created and instance.executor:
-        send_task_assigned_email.delay(instance.executor.email, instance.title)
 
-    if not created and hasattr(instance, "_old_executor"):
-        if instance.executor != instance._old_executor:
-            send_task_assigned_email.delay(instance.executor.email, instance.title)
+@receiver(post_save, sender=Comment)
+def send_comment_notification(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        notify_comments([instance])
 
 
-@receiver(post_save, sender=Comment)
-def send_comment_notification(sender, instance, created, **kwargs):
-    task = instance.task
-    commenter_name = instance.user.get_full_name()
-    comment_text = instance.text
-    send_task_commented_email.delay(
-        task.executor.email, task.title, commenter_name, comment_text
-    )
+@receiver(post_save, sender=TimeLog)
+def update_time_log_rollup(sender, instance, **kwargs):
+    # Refresh the row the log counts towards now and the one it counted
+    # towards when loaded, in case its day, user or task changed
+    rollup_keys = {instance.rollup_key, getattr(instance, "_loaded_rollup_key", None)}
+    rollup_keys -= {None}
+    for rollup_key in rollup_keys:
+        TimeLogDailyRollup.refresh(*rollup_key)
+    instance._loaded_rollup_key = instance.rollup_key
+
+    user_ids = [user_id for _, user_id, _ in rollup_keys]
+    transaction.on_commit(partial(invalidate_reports, user_ids))
+
+
+@receiver(post_delete, sender=TimeLog)
+def remove_time_log_from_rollup(sender, instance, **kwargs):
+    if instance.rollup_key:
+        TimeLogDailyRollup.refresh(*instance.rollup_key)
+        transaction.on_commit(partial(invalidate_reports, [instance.user_id]))
+
+
+def invalidate_renamed_task_reports(tasks):
+    """
+    Make the cached reports showing the tasks renamed since they were loaded
+    stale
+    """
+    renamed_ids = []
+    for task in tasks:
+        if task.title != getattr(task, "_loaded_title", task.title):
+            renamed_ids.append(task.pk)
+        task._loaded_title = task.title
+
+    if renamed_ids:
+        user_ids = list(
+            TimeLogDailyRollup.objects.filter(task__in=renamed_ids)
+            .values_list("user_id", flat=True)
+            .distinct()
+            .order_by()
+        )
+        transaction.on_commit(partial(invalidate_reports, user_ids))
 
 
 @receiver(post_save, sender=Task)
-def send_task_completed_notification(sender, instance, **kwargs):
-    if hasattr(instance, "_old_status"):
-        if (
-            instance._old_status != STATUS_COMPLETED
-            and instance.status == STATUS_COMPLETED
-        ):
-            commenters = (
-                Comment.objects.filter(task=instance)
-                .values_list("user__email", flat=True)
-                .distinct()
-            )
-            if commenters:
-                send_task_completed_email.delay(list(commenters), instance.title)
+def invalidate_task_reports(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        invalidate_renamed_task_reports([instance])
+
+
+@receiver(tasks_bulk_updated, sender=Task)
+def invalidate_bulk_task_reports(sender, objs, **kwargs):
+    invalidate_renamed_task_reports(objs)
+
+
+@receiver(pre_delete, sender=Task)
+@receiver(pre_delete, sender=User)
+def collect_orphaned_rollup_keys(sender, instance, **kwargs):
+    # The rollup rows of the task or user are deleted with it while its time
+    # logs are kept without it, remember which rows without it count them now
+    field = "task" if sender is Task else "user"
+    rows = TimeLogDailyRollup.objects.filter(**{field: instance})
+    instance._orphaned_rollup_keys = [
+        (day, None, task_id) if field == "user" else (day, user_id, None)
+        for day, user_id, task_id in rows.values_list("day", "user_id", "task_id")
+    ]
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=User)
+def refresh_orphaned_rollups(sender, instance, **kwargs):
+    rollup_keys = set(getattr(instance, "_orphaned_rollup_keys", []))
+    for rollup_key in rollup_keys:
+        TimeLogDailyRollup.refresh(*rollup_key)
+    if rollup_keys:
+        user_ids = [user_id for _, user_id, _ in rollup_keys]
+        transaction.on_commit(partial(invalidate_reports, user_ids))
+
+
+@receiver(post_save, sender=Attachment)
+def update_attachment_rollup(sender, instance, **kwargs):
+    # Take back what the attachment counted for when loaded and add what it
+    # counts for now
+    changes = []
+    loaded_change = getattr(instance, "_loaded_rollup_change", None)
+    if loaded_change:
+        created_at, files, size = loaded_change
+        changes.append((created_at, -files, -size))
+    if instance.rollup_change:
+        changes.append(instance.rollup_change)
+    AttachmentDailyRollup.apply_changes(changes)
+    instance._loaded_rollup_change = instance.rollup_change
+
+
+@receiver(post_delete, sender=Attachment)
+def remove_attachment_from_rollup(sender, instance, **kwargs):
+    if instance.rollup_change:
+        created_at, files, size = instance.rollup_change
+        AttachmentDailyRollup.apply_changes([(created_at, -files, -size)])
@@ -1,82 +1,167 @@
-from datetime import timedelta
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import groupby
 
+import elasticsearch
 from celery import shared_task
 from django.conf import settings
-from django.contrib.auth import get_user_model
 from django.core.files.storage import default_storage
-from django.core.mail import send_mail
-from django.db.models import F, Sum, DurationField, ExpressionWrapper
-from django.template.loader import render_to_string
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Min, Sum, DurationField, Window
+from django.db.models.functions import RowNumber
+from django.template.loader import get_template
 from django.utils import timezone
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
 
-from apps.tasks.models import TimeLog, Attachment
+from apps.common.helpers import WindowSum
+from apps.tasks import multipart
+from apps.tasks.indexing import index_documents
+from apps.tasks.models import TimeLog, Attachment, Notification
 
+logger = logging.getLogger(__name__)
 
-@shared_task
-def send_task_assigned_email(user_email, task_title):
-    subject = "[EBS-Task-Management] New task assigned"
-    message = f"You have been assigned a task: {task_title}"
-    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user_email])
 
+NOTIFICATION_FLUSH_MAX_RECIPIENTS = 500
 
-@shared_task
-def send_task_commented_email(user_email, task_title, commenter_name, comment_text):
-    subject = f"[EBS-Task-Management] New comment on task: {task_title}"
-    message = f"Comment Preview:\n{commenter_name}: {comment_text}"
-    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user_email])
+
+def get_notification_subject(notifications):
+    if len(notifications) > 1:
+        return f"[EBS-Task-Management] {len(notifications)} new notifications"
+
+    notification = notifications[0]
+    if notification.kind == Notification.KIND_ASSIGNED:
+        return "[EBS-Task-Management] New task assigned"
+    elif notification.kind == Notification.KIND_COMMENTED:
+        return f"[EBS-Task-Management] New comment on task: {notification.task.title}"
+    return f"[EBS-Task-Management] Task Completed: {notification.task.title}"
 
 
 @shared_task
-def send_task_completed_email(commenters_emails, task_title):
-    subject = f"[EBS-Task-Management] Task Completed: {task_title}"
-    message = f'The task "{task_title}" has been marked as completed.'
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        commenters_emails,
+def flush_notifications():
+    """
+    Send the pending notifications of the recipients whose oldest one waited
+    for the digest window, one email per recipient over a single connection
+    """
+    now = timezone.now()
+    due_recipients = (
+        Notification.objects.filter(sent_at__isnull=True)
+        .values("recipient")
+        .annotate(oldest=Min("created_at"))
+        .filter(oldest__lte=now - settings.NOTIFICATION_DIGEST_WINDOW)
+        .order_by("oldest")
+        .values("recipient")[:NOTIFICATION_FLUSH_MAX_RECIPIENTS]
+    )
+    template = get_template("emails/notification_digest.txt")
+
+    with transaction.atomic():
+        # Skip the rows a concurrent flush is already sending
+        notifications = (
+            Notification.objects.filter(
+                sent_at__isnull=True, recipient__in=due_recipients
+            )
+            .select_related("recipient", "task", "actor")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("recipient_id", "created_at", "id")
+        )
+
+        sent_ids = []
+        with get_connection(fail_silently=False) as connection:
+            for recipient, group in groupby(
+                notifications, key=lambda notification: notification.recipient
+            ):
+                group = list(group)
+                message = EmailMessage(
+                    subject=get_notification_subject(group),
+                    body=template.render({"notifications": group}),
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[recipient.email],
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                except Exception:
+                    # Left pending, the next flush tries again
+                    logger.exception("Could not send notifications to %s", recipient)
+                    continue
+                sent_ids += [notification.pk for notification in group]
+
+        Notification.objects.filter(pk__in=sent_ids).update(sent_at=now)
+    return len(sent_ids)
+
+
+WEEKLY_REPORT_TOP_TASKS = 20
+WEEKLY_REPORT_CHUNK_SIZE = 200
+
+
+def get_weekly_report_rows(user_ids, start_date, end_date):
+    """
+    Top tasks by logged time of each user along with the user's total, ranked
+    and totalled with window functions in a single query
+    """
+    return (
+        TimeLog.objects.filter(
+            user_id__in=user_ids,
+            start_time__lt=end_date,  # Start time must be before the end date
+            end_time__gte=start_date,  # End time must be after the start date
+        )
+        .values("user_id", "user__email", "task_id", "task__title")
+        .annotate(total_duration=Sum("duration"))
+        .annotate(
+            user_total_duration=Window(
+                WindowSum(Sum("duration")),
+                partition_by=F("user_id"),
+                output_field=DurationField(),
+            ),
+            rank=Window(
+                RowNumber(),
+                partition_by=F("user_id"),
+                order_by=[Sum("duration").desc(), F("task_id").asc()],
+            ),
+        )
+        .filter(rank__lte=WEEKLY_REPORT_TOP_TASKS)
+        .order_by("user_id", "rank")
     )
 
 
 @shared_task
 def send_weekly_report():
-    User = get_user_model()
-    users = User.objects.all()
-
     # Get date range for the past week
     end_date = timezone.now()
     start_date = end_date - timedelta(days=7)
 
-    for user in users:
-        # Get user's time logs for the past week
-        queryset = TimeLog.objects.filter(
-            user=user,
-            start_time__lt=end_date,  # Start time must be before the end date
-            end_time__gte=start_date,  # End time must be after the start date
+    # Only users with time logs in the past week get a report
+    user_ids = list(
+        TimeLog.objects.filter(
+            user__isnull=False, start_time__lt=end_date, end_time__gte=start_date
         )
+        .values_list("user_id", flat=True)
+        .distinct()
+        .order_by("user_id")
+    )
 
-        # Check if there are any time logs for the user
-        if not queryset.exists():
-            continue
-
-        # Aggregate tasks data
-        tasks = (
-            queryset.values("task__id", "task__title")
-            .annotate(
-                total_duration=Sum(
-                    ExpressionWrapper(F("duration"), output_field=DurationField())
-                )
-            )
-            .order_by("-total_duration")[:20]
+    for i in range(0, len(user_ids), WEEKLY_REPORT_CHUNK_SIZE):
+        send_weekly_report_chunk.delay(
+            user_ids[i : i + WEEKLY_REPORT_CHUNK_SIZE],
+            start_date.isoformat(),
+            end_date.isoformat(),
         )
 
-        # Calculate total time
-        total_duration = queryset.aggregate(
-            total_duration=Sum(
-                ExpressionWrapper(F("duration"), output_field=DurationField())
-            )
-        )["total_duration"]
+
+@shared_task
+def send_weekly_report_chunk(user_ids, start_date, end_date):
+    rows = get_weekly_report_rows(
+        user_ids, datetime.fromisoformat(start_date), datetime.fromisoformat(end_date)
+    )
+    template = get_template("emails/weekly_report.html")
+
+    messages = []
+    for (user_id, user_email), tasks in groupby(
+        rows, key=lambda row: (row["user_id"], row["user__email"])
+    ):
+        tasks = list(tasks)
 
         # Convert duration to minutes
         formatted_tasks = [
@@ -86,50 +171,74 @@ def send_weekly_report():
             }
             for task in tasks
         ]
-
-        total_minutes = (
-            int(total_duration.total_seconds() // 60) if total_duration else 0
-        )
+        total_minutes = int(tasks[0]["user_total_duration"].total_seconds() // 60)
 
         # Render email template
-        html_content = render_to_string(
-            "emails/weekly_report.html",
+        html_content = template.render(
             {
                 "tasks": formatted_tasks,
                 "total_logged_time": total_minutes,
-            },
+            }
         )
 
-        # Send email
-        send_mail(
+        message = EmailMultiAlternatives(
             subject="Your Weekly Time Report",
-            message="",  # Empty string for plain text version
+            body="",  # Empty string for plain text version
             from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_content,
-            fail_silently=False,
+            to=[user_email],
         )
+        message.attach_alternative(html_content, "text/html")
+        messages.append(message)
+
+    # Send all reports of the chunk over a single connection
+    with get_connection(fail_silently=False) as connection:
+        return connection.send_messages(messages)
 
 
-def process_attachment(attachment):
-    minio_client = default_storage.client
-    bucket_name = settings.MINIO_MEDIA_FILES_BUCKET
+CLEAN_UPLOADS_CHUNK_SIZE = 500
+CLEAN_UPLOADS_MAX_WORKERS = 8
 
-    object_name = attachment.file.name
+
+def get_object_size(object_name):
+    """
+    Size of a stored object, None if it does not exist
+    """
     try:
-        object_stats = minio_client.stat_object(bucket_name, object_name)
+        object_stats = default_storage.client.stat_object(
+            settings.MINIO_MEDIA_FILES_BUCKET, object_name
+        )
     except S3Error:
-        attachment.delete()
-        return True, False
+        return None
+    return object_stats.size
+
+
+@shared_task
+def mark_attachments_uploaded(uploads):
+    """
+    Apply a batch of (object name, size) upload events received by the webhook
+    """
+    return Attachment.mark_uploaded(uploads)
+
+
+def remove_objects(object_names):
+    """
+    Remove stored objects with a single batch delete request
+    """
+    errors = default_storage.client.remove_objects(
+        settings.MINIO_MEDIA_FILES_BUCKET,
+        [DeleteObject(object_name) for object_name in object_names],
+    )
+    # Deletion is lazy, the errors have to be consumed for it to happen
+    for error in errors:
+        logger.error("Could not remove %s: %s", error.name, error.message)
 
-    if object_stats.size > 0:
-        attachment.status = "Uploaded"
-        attachment.save(update_fields=["status"])
-        return False, True
 
-    minio_client.remove_object(bucket_name, object_name)
-    attachment.delete()
-    return True, False
+def abort_multipart_upload(object_name, upload_id):
+    try:
+        multipart.abort_upload(object_name, upload_id)
+    except S3Error as exc:
+        if exc.code != "NoSuchUpload":
+            logger.error("Could not abort upload of %s: %s", object_name, exc)
 
 
 @shared_task
@@ -141,15 +250,80 @@ def clean_pending_uploads():
         status="Pending Upload",
         created_at__lt=upper_threshold_time,
         created_at__gte=lower_threshold_time,
-    )
+    ).order_by("id")
 
+    pending_count = 0
     deleted_count = 0
     updated_count = 0
-    for attachment in pending_attachments:
-        was_deleted, was_updated = process_attachment(attachment=attachment)
-        if was_deleted:
-            deleted_count += 1
-        if was_updated:
-            updated_count += 1
-
-    return f"Pending: {len(pending_attachments)}, Deleted: {deleted_count}, Updated: {updated_count}"
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=CLEAN_UPLOADS_MAX_WORKERS) as executor:
+        while True:
+            # Walk the pending attachments chunk by chunk
+            chunk = list(
+                pending_attachments.filter(id__gt=last_id).values_list(
+                    "id", "task_id", "file", "upload_id"
+                )[:CLEAN_UPLOADS_CHUNK_SIZE]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            pending_count += len(chunk)
+
+            # Stat the objects of the chunk concurrently
+            object_sizes = executor.map(
+                get_object_size, [object_name for _, _, object_name, _ in chunk]
+            )
+
+            uploads = []
+            deleted_ids = []
+            empty_objects = []
+            stale_objects = []
+            stale_upload_ids = []
+            for (attachment_id, task_id, object_name, upload_id), object_size in zip(
+                chunk, object_sizes
+            ):
+                if object_size is None:
+                    deleted_ids.append(attachment_id)
+                    if upload_id:
+                        stale_objects.append(object_name)
+                        stale_upload_ids.append(upload_id)
+                elif object_size > 0:
+                    uploads.append((attachment_id, task_id, object_name, object_size))
+                else:
+                    deleted_ids.append(attachment_id)
+                    empty_objects.append(object_name)
+
+            if empty_objects:
+                remove_objects(empty_objects)
+            # Drop the parts of multipart uploads never completed
+            list(executor.map(abort_multipart_upload, stale_objects, stale_upload_ids))
+            if uploads:
+                Attachment.apply_uploads(uploads)
+            if deleted_ids:
+                # Skip attachments the webhook marked as uploaded meanwhile
+                Attachment.objects.filter(
+                    id__in=deleted_ids, status="Pending Upload"
+                ).delete()
+
+            updated_count += len(uploads)
+            deleted_count += len(deleted_ids)
+
+            if len(chunk) < CLEAN_UPLOADS_CHUNK_SIZE:
+                break
+
+    return (
+        f"Pending: {pending_count}, Deleted: {deleted_count}, Updated: {updated_count}"
+    )
+
+
+@shared_task(
+    autoretry_for=(elasticsearch.ConnectionError, elasticsearch.ConnectionTimeout),
+    retry_backoff=True,
+    max_retries=8,
+)
+def update_search_index(label, pks):
+    """
+    Bring the search documents of these instances in line with the database,
+    retried while Elasticsearch is unreachable
+    """
+    index_documents(label, pks)
@@ -1,21 +1,51 @@
 import json
+import threading
+import time
+from io import StringIO
 from datetime import timedelta
-from unittest.mock import patch
+from unittest.mock import Mock, call, patch
 
+import elasticsearch
+from django.conf import settings
 from django.core import mail
+from django.core.mail import get_connection
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
+from django_elasticsearch_dsl.search import Search
+from elasticsearch_dsl.response import Response
 from minio.error import S3Error
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from urllib3 import HTTPResponse
 
-from apps.tasks.models import Task, TimeLog, Comment, Attachment
+from apps.common.pagination import SearchAfterPagination
+from apps.tasks.filters import TimeLogFilter
+from apps.tasks.indexing import (
+    PendingDocuments,
+    get_pending_documents,
+    get_reindex_target,
+    index_documents,
+    queue_documents,
+    set_reindex_target,
+)
+from apps.tasks.models import (
+    Task,
+    TimeLog,
+    Comment,
+    Attachment,
+    AttachmentDailyRollup,
+    Notification,
+    TimeLogDailyRollup,
+)
 from apps.tasks.tasks import (
+    flush_notifications,
     send_weekly_report,
     clean_pending_uploads,
-    process_attachment,
 )
 from apps.users.models import User
 
@@ -43,6 +73,54 @@ class TaskViewSetTests(APITestCase):
             len(response.data["results"]), 2
         )  # Should return both tasks from fixtures
 
+    def test_list_tasks_logged_time(self):
+        """Test logged time is computed for each task in the list"""
+        response = self.client.get(self.task_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["logged_time"], 120)
+
+    def test_list_tasks_query_count(self):
+        """Test the number of queries does not grow with the number of tasks"""
+        now = timezone.now()
+        for i in range(10):
+            task = Task.objects.create(title=f"Task {i}", executor=self.user)
+            TimeLog.objects.create(
+                task=task,
+                user=self.user,
+                start_time=now - timedelta(hours=1),
+                end_time=now,
+            )
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.task_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 12)
+        self.assertEqual(response.data["results"][-1]["logged_time"], 60)
+
+    def test_list_tasks_cursor_pagination(self):
+        """Test keyset pagination of tasks skips the total count"""
+        Task.objects.bulk_create(Task(title=f"Task {i}") for i in range(105))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.task_list_url, {"pagination": "cursor"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["results"]), 100)
+        self.assertEqual(response.data["results"][0]["id"], self.task.pk)
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 7)
+        self.assertIsNone(response.data["next"])
+
+    def test_list_comments_cursor_pagination(self):
+        """Test keyset pagination of comments selected with a header"""
+        url = reverse("tasks-comments", kwargs={"pk": self.task.pk})
+        response = self.client.get(url, headers={"X-Pagination": "cursor"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+
     def test_retrieve_task(self):
         """Test retrieving a single task"""
         response = self.client.get(self.task_detail_url)
@@ -50,6 +128,24 @@ class TaskViewSetTests(APITestCase):
         self.assertEqual(response.data["title"], "Fix Bug #101")
         self.assertEqual(response.data["executor"]["email"], "jane.smith@example.com")
 
+    def test_retrieve_task_bounded_collections(self):
+        """Test only the latest comments are embedded in task details"""
+        Comment.objects.bulk_create(
+            Comment(task=self.task, user=self.user, text=f"Comment {i}")
+            for i in range(25)
+        )
+
+        with self.assertNumQueries(4):
+            response = self.client.get(self.task_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["comments"]), 20)
+        self.assertEqual(response.data["comments"][0]["text"], "Comment 24")
+        self.assertEqual(response.data["comments_count"], 26)
+        self.assertTrue(response.data["comments_next"].endswith("/tasks/1/comments"))
+        self.assertEqual(response.data["time_logs_count"], 1)
+        self.assertIsNone(response.data["time_logs_next"])
+        self.assertEqual(response.data["logged_time"], 120)
+
     def test_create_task(self):
         """Test creating a new task"""
         data = {
@@ -109,6 +205,123 @@ class TaskViewSetTests(APITestCase):
         self.assertEqual(new_comment.text, "Working on the fix now")
         self.assertEqual(new_comment.user, self.user)
 
+    def test_create_comment_queries(self):
+        """Test creating a comment loads the task once and queues its notification"""
+        url = reverse("tasks-comments", kwargs={"pk": self.task.pk})
+        # Task, then comment and notification in one savepoint
+        with self.assertNumQueries(5):
+            response = self.client.post(url, {"text": "On it"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient_id, self.task.executor_id)
+        self.assertEqual(notification.actor, self.user)
+        self.assertEqual(notification.text, "On it")
+
+    def test_import_comments(self):
+        """Test importing comments in bulk notifies the executor in one batch"""
+        url = reverse("tasks-comments-bulk", kwargs={"pk": self.task.pk})
+        data = [{"text": f"Imported {i}"} for i in range(20)]
+        # Task, savepoint, comments, notifications and release
+        with self.assertNumQueries(5):
+            response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        comments = Comment.objects.filter(text__startswith="Imported").order_by("id")
+        self.assertEqual(
+            [item["id"] for item in response.data],
+            list(comments.values_list("id", flat=True)),
+        )
+        self.assertEqual({comment.user for comment in comments}, {self.user})
+        self.assertEqual(
+            Notification.objects.filter(
+                recipient=self.task.executor, kind=Notification.KIND_COMMENTED
+            ).count(),
+            20,
+        )
+
+    def test_import_comments_without_executor(self):
+        """Test comments imported on a task without executor notify nobody"""
+        Task.objects.filter(pk=self.task.pk).update(executor=None)
+        url = reverse("tasks-comments-bulk", kwargs={"pk": self.task.pk})
+        response = self.client.post(url, [{"text": "Hello"}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_import_comments_validation(self):
+        """Test an import with an invalid comment creates nothing"""
+        url = reverse("tasks-comments-bulk", kwargs={"pk": self.task.pk})
+        response = self.client.post(
+            url, [{"text": "Fine"}, {"text": ""}], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Comment.objects.filter(text="Fine").exists())
+
+    def test_bulk_create_tasks(self):
+        """Test creating tasks in bulk with one query per kind of row"""
+        url = reverse("tasks-bulk")
+        data = [
+            {"title": "Synced 1", "executor": 1},
+            {"title": "Synced 2", "executor": "1"},
+            {"title": "Synced 3"},
+        ]
+        # Executors, savepoint, tasks, notifications and release
+        with self.assertNumQueries(5):
+            response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        tasks = Task.objects.filter(title__startswith="Synced").order_by("id")
+        self.assertEqual([task["id"] for task in response.data], [t.id for t in tasks])
+        self.assertEqual([task.executor_id for task in tasks], [1, 1, 2])
+        self.assertEqual({task.owner for task in tasks}, {self.user})
+        self.assertEqual(
+            sorted(Notification.objects.values_list("recipient", "kind")),
+            [(1, "assigned"), (1, "assigned"), (2, "assigned")],
+        )
+
+    def test_bulk_create_tasks_validation(self):
+        """Test a bulk create with an unknown executor creates nothing"""
+        url = reverse("tasks-bulk")
+        data = [{"title": "Valid", "executor": 1}, {"title": "Bad", "executor": 999}]
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("executor", response.data[1])
+        self.assertFalse(Task.objects.filter(title="Valid").exists())
+
+    def test_bulk_update_tasks(self):
+        """Test updating tasks in bulk notifies their changes"""
+        url = reverse("tasks-bulk")
+        data = [
+            {"id": 2, "status": "completed"},
+            {"id": 1, "executor": 1, "status": "in_progress"},
+        ]
+        # Executors, tasks, savepoint, update, commenters, notifications and release
+        with self.assertNumQueries(7):
+            response = self.client.patch(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(task["id"], task["status"]) for task in response.data],
+            [(2, "completed"), (1, "in_progress")],
+        )
+
+        self.assertEqual(Task.objects.get(pk=1).executor_id, 1)
+        self.assertEqual(Task.objects.get(pk=2).status, "completed")
+        self.assertEqual(
+            sorted(Notification.objects.values_list("recipient", "kind", "task")),
+            [(1, "assigned", 1), (2, "completed", 2)],
+        )
+
+    def test_bulk_update_unknown_or_repeated_tasks(self):
+        """Test a bulk update naming a task twice or a missing task is refused"""
+        url = reverse("tasks-bulk")
+        for data in [
+            [{"id": 1, "status": "completed"}, {"id": 1, "status": "open"}],
+            [{"id": 1, "status": "completed"}, {"id": 999, "status": "open"}],
+        ]:
+            response = self.client.patch(url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("id", response.data)
+        self.assertEqual(Task.objects.get(pk=1).status, "open")
+
     def test_list_time_logs(self):
         """Test listing time logs for a task"""
         url = reverse("tasks-logs", kwargs={"pk": self.task.pk})
@@ -219,6 +432,7 @@ class ReportViewSetTests(APITestCase):
         self.user = User.objects.get(pk=2)  # Jane Smith
         self.client.force_authenticate(user=self.user)
         self.url = reverse("tasks-reports")
+        cache.clear()
 
     def test_get_report(self):
         """Test getting time report"""
@@ -299,6 +513,24 @@ class ReportViewSetTests(APITestCase):
         # Total duration should be 0 when all durations are NULL
         self.assertEqual(response.data["results"]["total_logged_time"], 0)
 
+    def test_get_report_top_with_pagination(self):
+        """Test total, count and top tasks are fetched in a single query"""
+        params = {"date_from": "2024-11-01", "date_to": "2024-11-30", "top": 1}
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, params)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(response.data["results"]["total_logged_time"], 240)
+        self.assertEqual(len(response.data["results"]["tasks"]), 1)
+
+    def test_get_report_invalid_page(self):
+        """Test requesting a page past the last one"""
+        params = {"date_from": "2024-11-01", "date_to": "2024-11-30", "page": 2}
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_report_with_multiple_invalid_filters(self):
         """Test report generation with multiple invalid filter parameters"""
         response = self.client.get(
@@ -311,6 +543,315 @@ class ReportViewSetTests(APITestCase):
         self.assertIn("top", response.data)
 
 
+class ReportExportTests(APITestCase):
+    fixtures = ["users", "tasks", "time_logs"]
+
+    def setUp(self):
+        self.user = User.objects.get(pk=2)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("tasks-reports-export")
+        self.params = {"date_from": "2024-11-01", "date_to": "2024-11-30"}
+
+    def test_export_csv(self):
+        """Test streaming filtered time logs as CSV"""
+        response = self.client.get(self.url, {**self.params, "user": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("id,task,task_title,user,user_email"))
+        self.assertIn("Fix Bug #101,2,jane.smith@example.com", lines[1])
+        self.assertTrue(lines[1].endswith(",120,Worked on fixing the bug."))
+
+    def test_export_ndjson(self):
+        """Test streaming filtered time logs as NDJSON"""
+        response = self.client.get(self.url, {**self.params, "export_format": "ndjson"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        content = b"".join(response.streaming_content).decode()
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["id"] for row in rows], [1, 2])
+        self.assertEqual(rows[0]["logged_time"], 120)
+        self.assertEqual(rows[0]["end_time"], "2024-11-07T10:00:00+00:00")
+
+    def test_export_unknown_format(self):
+        """Test exporting in an unsupported format"""
+        response = self.client.get(self.url, {"export_format": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TimeLogFilterTests(APITestCase):
+    fixtures = ["users", "tasks"]
+
+    def setUp(self):
+        self.user = User.objects.get(pk=2)
+        self.task = Task.objects.get(pk=1)
+
+    def test_date_range_is_half_open(self):
+        """Test date filters include the whole last day and nothing after it"""
+        for end_time in [
+            "2024-11-06T23:59:59Z",
+            "2024-11-07T00:00:00Z",
+            "2024-11-08T23:59:59Z",
+            "2024-11-09T00:00:00Z",
+        ]:
+            TimeLog.objects.create(
+                task=self.task,
+                user=self.user,
+                start_time="2024-11-01T00:00:00Z",
+                end_time=end_time,
+            )
+
+        filterset = TimeLogFilter(
+            {"date_from": "2024-11-07", "date_to": "2024-11-08"},
+            queryset=TimeLog.objects.all(),
+        )
+        self.assertTrue(filterset.is_valid())
+        self.assertEqual(filterset.qs.count(), 2)
+        self.assertNotIn("::date", str(filterset.qs.query))
+
+
+class TimeLogDailyRollupTests(APITestCase):
+    fixtures = ["users", "tasks", "time_logs"]
+
+    def setUp(self):
+        self.user = User.objects.get(pk=2)
+        self.task = Task.objects.get(pk=1)
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+
+    def get_rollup_minutes(self, day, task=None):
+        rollup = TimeLogDailyRollup.objects.get(
+            day=day, user=self.user, task=task or self.task
+        )
+        return rollup.duration.total_seconds() // 60
+
+    def test_rollup_updated_on_create(self):
+        """Test creating a time log adds its duration to the day total"""
+        TimeLog.objects.create(
+            task=self.task,
+            user=self.user,
+            start_time="2024-11-07T12:00:00Z",
+            end_time="2024-11-07T12:30:00Z",
+        )
+        self.assertEqual(self.get_rollup_minutes("2024-11-07"), 150)
+
+    def test_rollup_updated_on_stop_timer(self):
+        """Test stopping a timer adds the logged time to today's total"""
+        TimeLog.objects.create(
+            task=self.task,
+            user=self.user,
+            start_time=timezone.now() - timedelta(minutes=45),
+        )
+        self.assertFalse(
+            TimeLogDailyRollup.objects.filter(day=timezone.localdate()).exists()
+        )
+
+        url = reverse("tasks-logs-stop", kwargs={"pk": self.task.pk})
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_rollup_minutes(timezone.localdate()), 45)
+
+    def test_rollup_moved_on_edit(self):
+        """Test moving a time log to another day updates both day totals"""
+        time_log = TimeLog.objects.get(pk=1)
+        time_log.start_time = "2024-11-08T08:00:00Z"
+        time_log.end_time = "2024-11-08T09:00:00Z"
+        time_log.save()
+
+        self.assertFalse(TimeLogDailyRollup.objects.filter(day="2024-11-07").exists())
+        self.assertEqual(self.get_rollup_minutes("2024-11-08"), 60)
+
+    def test_rollup_updated_on_delete(self):
+        """Test deleting a time log removes it from the day total"""
+        TimeLog.objects.get(pk=1).delete()
+        self.assertFalse(TimeLogDailyRollup.objects.filter(day="2024-11-07").exists())
+
+    def test_rollup_merged_on_task_delete(self):
+        """Test logs of deleted tasks are counted in one row without task"""
+        other_task = Task.objects.get(pk=2)
+        for task in [self.task, other_task]:
+            TimeLog.objects.create(
+                task=task,
+                user=self.user,
+                start_time="2024-11-10T08:00:00Z",
+                end_time="2024-11-10T08:30:00Z",
+            )
+        self.task.delete()
+        other_task.delete()
+
+        orphaned_rollup = TimeLogDailyRollup.objects.filter(
+            day="2024-11-10", user=self.user, task=None
+        )
+        self.assertEqual(orphaned_rollup.get().duration, timedelta(minutes=60))
+
+        # The orphaned logs keep updating that single row
+        orphaned_log = TimeLog.objects.filter(
+            task=None, user=self.user, end_time__date="2024-11-10"
+        ).first()
+        orphaned_log.end_time = "2024-11-10T08:45:00Z"
+        orphaned_log.save()
+        self.assertEqual(orphaned_rollup.get().duration, timedelta(minutes=75))
+
+        orphaned_log.delete()
+        self.assertEqual(orphaned_rollup.get().duration, timedelta(minutes=30))
+
+    def test_rebuild_rollup_command(self):
+        """Test the rollup can be rebuilt from the raw time logs"""
+        TimeLogDailyRollup.objects.all().delete()
+        call_command("rebuild_time_log_rollup", stdout=StringIO())
+
+        self.assertEqual(TimeLogDailyRollup.objects.count(), 2)
+        self.assertEqual(self.get_rollup_minutes("2024-11-07"), 120)
+
+    def test_report_from_rollup(self):
+        """Test the report is answered from the rollup table"""
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("tasks-reports"),
+                {"date_from": "2024-11-01", "date_to": "2024-11-30"},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"]["total_logged_time"], 240)
+        self.assertEqual(len(response.data["results"]["tasks"]), 2)
+
+
+class TimeLogDailyRollupConcurrencyTests(APITransactionTestCase):
+    fixtures = ["users", "tasks"]
+
+    def create_log(self, start_time, end_time):
+        try:
+            TimeLog.objects.create(
+                task_id=1, user_id=2, start_time=start_time, end_time=end_time
+            )
+        finally:
+            connection.close()
+
+    def test_concurrent_refreshes_count_both_logs(self):
+        """Test a refresh waits for a concurrent one of the same row to commit"""
+        first_refreshed = threading.Event()
+        first_commit = threading.Event()
+
+        def create_first_log():
+            try:
+                with transaction.atomic():
+                    TimeLog.objects.create(
+                        task_id=1,
+                        user_id=2,
+                        start_time="2024-11-12T08:00:00Z",
+                        end_time="2024-11-12T08:30:00Z",
+                    )
+                    first_refreshed.set()
+                    first_commit.wait(timeout=5)
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=create_first_log)
+        first.start()
+        first_refreshed.wait(timeout=5)
+        # Its refresh cannot see the first log, which is not committed yet
+        second = threading.Thread(
+            target=self.create_log,
+            args=["2024-11-12T09:00:00Z", "2024-11-12T10:00:00Z"],
+        )
+        second.start()
+        second.join(timeout=0.5)
+        first_commit.set()
+        first.join()
+        second.join()
+
+        rollup = TimeLogDailyRollup.objects.get(day="2024-11-12", user=2, task=1)
+        self.assertEqual(rollup.duration, timedelta(minutes=90))
+
+
+class ReportCacheTests(APITestCase):
+    fixtures = ["users", "tasks", "time_logs"]
+
+    def setUp(self):
+        self.user = User.objects.get(pk=2)
+        self.task = Task.objects.get(pk=1)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("tasks-reports")
+        self.params = {"date_from": "2024-11-01", "date_to": "2024-11-30"}
+        cache.clear()
+
+    def test_report_served_from_cache(self):
+        """Test a repeated report request does not query the database"""
+        response = self.client.get(self.url, self.params)
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(self.url, self.params)
+        self.assertEqual(cached_response.data, response.data)
+
+    def test_report_cache_invalidated_by_time_log(self):
+        """Test writing a time log invalidates cached reports"""
+        self.client.get(self.url, {**self.params, "user": self.user.pk})
+        self.client.get(self.url, self.params)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeLog.objects.create(
+                task=self.task,
+                user=self.user,
+                start_time="2024-11-08T08:00:00Z",
+                end_time="2024-11-08T09:00:00Z",
+            )
+
+        response = self.client.get(self.url, {**self.params, "user": self.user.pk})
+        self.assertEqual(response.data["results"]["total_logged_time"], 180)
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.data["results"]["total_logged_time"], 300)
+
+    def test_report_cache_kept_for_other_users_logs(self):
+        """Test a time log of another user keeps user filtered reports cached"""
+        self.client.get(self.url, {**self.params, "user": self.user.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeLog.objects.create(
+                task=self.task,
+                user_id=1,
+                start_time="2024-11-08T08:00:00Z",
+                end_time="2024-11-08T09:00:00Z",
+            )
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {**self.params, "user": self.user.pk})
+
+    def test_report_cache_invalidated_by_task_rename(self):
+        """Test renaming a task invalidates the cached reports showing it"""
+        user_params = {**self.params, "user": self.user.pk}
+        self.client.get(self.url, user_params)
+        self.client.get(self.url, self.params)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.title = "Renamed"
+            self.task.save()
+
+        for params in [user_params, self.params]:
+            response = self.client.get(self.url, params)
+            titles = [task["title"] for task in response.data["results"]["tasks"]]
+            self.assertIn("Renamed", titles)
+
+    def test_report_cache_kept_on_other_task_changes(self):
+        """Test task changes other than its title keep cached reports"""
+        self.client.get(self.url, self.params)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.status = "in_progress"
+            self.task.save()
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url, self.params)
+
+    def test_report_cache_scoped_to_requesting_user(self):
+        """Test a report cached for one user is not served to another"""
+        self.client.get(self.url, self.params)
+
+        self.client.force_authenticate(user=User.objects.get(pk=1))
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, self.params)
+        self.assertEqual(response.data["results"]["total_logged_time"], 240)
+
+
 class TestTaskModelStr(APITestCase):
     fixtures = ["users", "tasks", "time_logs", "comments"]
 
@@ -347,7 +888,7 @@ class TestTaskModelStr(APITestCase):
         self.assertEqual(str(attachment), expected_str)
 
 
-@override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
+@override_settings(NOTIFICATION_DIGEST_WINDOW=timedelta(0))
 class TaskSignalTests(APITestCase):
     fixtures = ["users", "tasks", "comments"]
 
@@ -360,6 +901,7 @@ class TaskSignalTests(APITestCase):
     def test_send_task_assigned_notification(self):
         self.task1.executor = self.user1  # Reassign executor
         self.task1.save()
+        flush_notifications()
 
         # Check if an email is sent to the new executor
         self.assertEqual(len(mail.outbox), 1)
@@ -370,11 +912,13 @@ class TaskSignalTests(APITestCase):
         Comment.objects.create(
             task=self.task1, user=self.user2, text="Another comment."
         )
+        flush_notifications()
 
         # Check if an email is sent to the executor of the task
         self.assertEqual(len(mail.outbox), 1)
         self.assertIn(self.user2.email, mail.outbox[0].to)
         self.assertIn(self.task1.title, mail.outbox[0].subject)
+        self.assertIn("Another comment.", mail.outbox[0].body)
 
     def test_send_task_completed_notification_with_commenters(self):
         Comment.objects.create(
@@ -382,12 +926,17 @@ class TaskSignalTests(APITestCase):
         )
         self.task1.status = "completed"
         self.task1.save()
+        flush_notifications()
 
-        # Check if an email is sent to distinct commenters
+        # Check if an email is sent to distinct commenters, the executor gets the
+        # comment and the completion in one digest
         self.assertEqual(len(mail.outbox), 2)
-        self.assertIn(self.user2.email, mail.outbox[0].to)
-        self.assertIn(self.user1.email, mail.outbox[1].to)
+        self.assertIn(self.user1.email, mail.outbox[0].to)
         self.assertIn(self.task1.title, mail.outbox[0].subject)
+        self.assertIn(self.user2.email, mail.outbox[1].to)
+        self.assertIn("2 new notifications", mail.outbox[1].subject)
+        self.assertIn("Another comment.", mail.outbox[1].body)
+        self.assertIn("has been marked as completed", mail.outbox[1].body)
 
     def test_send_task_completed_notification_no_commenters(self):
         Comment.objects.filter(
@@ -395,11 +944,172 @@ class TaskSignalTests(APITestCase):
         ).delete()  # Ensure no comments on the task
         self.task1.status = "completed"
         self.task1.save()
+        flush_notifications()
 
         # No email should be sent as there are no commenters
         self.assertEqual(len(mail.outbox), 0)
 
+    def test_patch_task_compares_loaded_state(self):
+        """Test updating a task does not load it again to detect its changes"""
+        self.client.force_authenticate(user=self.user1)
+        url = reverse("tasks-detail", kwargs={"pk": self.task1.pk})
+        # Task, new executor, then the update and the notification in one savepoint
+        with self.assertNumQueries(6):
+            response = self.client.patch(url, {"executor": self.user1.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+
+        flush_notifications()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(self.user1.email, mail.outbox[0].to)
+
+    def test_notifications_sent_once_per_change(self):
+        """Test saving a task again without changes sends no new email"""
+        self.task1.executor = self.user1
+        self.task1.save()
+        self.task1.save()
+        flush_notifications()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_unassign_executor(self):
+        """Test removing the executor of a task sends no email"""
+        self.task1.executor = None
+        self.task1.save()
+        Comment.objects.create(task=self.task1, user=self.user2, text="Anyone?")
+        self.assertFalse(Notification.objects.exists())
+
+    def test_bulk_update_notifications(self):
+        """Test tasks changed with bulk_update are notified"""
+        tasks = list(Task.objects.filter(pk__in=[1, 2]).order_by("pk"))
+        tasks[0].executor_id = self.user1.pk
+        tasks[1].status = "completed"
+        Task.objects.bulk_update(tasks, ["executor", "status"])
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list("recipient", "kind", "task")),
+            [(1, "assigned", 1), (2, "completed", 2)],
+        )
 
+    def test_notifications_rolled_back_with_change(self):
+        """Test notifications are only kept when the change is committed"""
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.task1.executor = self.user1
+                self.task1.save()
+                raise ValueError
+        self.assertFalse(Notification.objects.exists())
+
+
+class NotificationOutboxAtomicTests(APITransactionTestCase):
+    fixtures = ["users", "tasks"]
+
+    def setUp(self):
+        self.user = User.objects.get(pk=1)
+        self.client.force_authenticate(user=self.user)
+        patcher = patch.object(
+            Notification.objects,
+            "bulk_create",
+            side_effect=DatabaseError("outbox unavailable"),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_task_create_rolled_back(self):
+        """Test a task is not created when its notification cannot be written"""
+        response = self.client.post(
+            reverse("tasks-list"),
+            {"title": "Unnotified", "executor": self.user.pk},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(Task.objects.filter(title="Unnotified").exists())
+
+    def test_task_update_rolled_back(self):
+        """Test a task is not reassigned when its notification cannot be written"""
+        task = Task.objects.exclude(executor=self.user).first()
+        response = self.client.patch(
+            reverse("tasks-detail", args=[task.pk]),
+            {"executor": self.user.pk},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        task.refresh_from_db()
+        self.assertNotEqual(task.executor_id, self.user.pk)
+
+    def test_comment_create_rolled_back(self):
+        """Test a comment is not created when its notification cannot be written"""
+        task = Task.objects.filter(executor__isnull=False).first()
+        response = self.client.post(
+            reverse("tasks-comments", args=[task.pk]),
+            {"text": "Unnotified"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(Comment.objects.filter(text="Unnotified").exists())
+
+
+class FlushNotificationsTests(APITestCase):
+    fixtures = ["users", "tasks"]
+
+    def setUp(self):
+        self.user1 = User.objects.get(pk=1)
+        self.user2 = User.objects.get(pk=2)
+        self.task = Task.objects.get(pk=1)
+        self.task.executor = self.user1
+        self.task.save()
+        Notification.objects.all().delete()
+
+    def _comment(self, text, minutes_ago=10):
+        Comment.objects.create(task=self.task, user=self.user2, text=text)
+        Notification.objects.filter(text=text).update(
+            created_at=timezone.now() - timedelta(minutes=minutes_ago)
+        )
+
+    def test_digest_per_recipient(self):
+        """Test pending notifications of a recipient are sent in one email"""
+        for i in range(50):
+            self._comment(f"Comment {i}")
+
+        with patch("apps.tasks.tasks.get_connection", wraps=get_connection) as mock:
+            self.assertEqual(flush_notifications(), 50)
+        mock.assert_called_once()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user1.email])
+        self.assertIn("50 new notifications", mail.outbox[0].subject)
+        self.assertIn("Comment 0", mail.outbox[0].body)
+        self.assertIn("Comment 49", mail.outbox[0].body)
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=True).exists())
+
+        # Nothing is sent twice
+        self.assertEqual(flush_notifications(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_recipient_waits_for_window(self):
+        """Test notifications are held until the oldest one is past the window"""
+        self._comment("Recent", minutes_ago=1)
+        self.assertEqual(flush_notifications(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+        # A due notification takes the recent ones along
+        self._comment("Old")
+        self.assertEqual(flush_notifications(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_email_stays_pending(self):
+        """Test notifications whose email failed are retried by the next flush"""
+        self._comment("Lost")
+        with patch(
+            "django.core.mail.EmailMessage.send", side_effect=OSError("SMTP down")
+        ):
+            self.assertEqual(flush_notifications(), 0)
+        self.assertTrue(Notification.objects.filter(sent_at__isnull=True).exists())
+
+        self.assertEqual(flush_notifications(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
 class SendWeeklyReportTests(APITestCase):
     fixtures = ["users", "tasks"]
 
@@ -452,6 +1162,34 @@ class SendWeeklyReportTests(APITestCase):
                 "Your Weekly Time Report", [msg.subject for msg in mail.outbox]
             )
 
+    @patch("apps.tasks.tasks.get_connection")
+    def test_send_weekly_report_batched(self, mock_get_connection):
+        """Test reports are built in one query and sent over one connection"""
+        now = timezone.now()
+        for task in [self.task1, self.task2]:
+            for user in [self.user1, self.user2]:
+                TimeLog.objects.create(
+                    task=task,
+                    user=user,
+                    start_time=now - timedelta(days=2, hours=1),
+                    end_time=now - timedelta(days=2),
+                )
+        connection = mock_get_connection.return_value.__enter__.return_value
+
+        # One query for the users to report, one for all their reports
+        with self.assertNumQueries(2):
+            send_weekly_report()
+
+        mock_get_connection.assert_called_once()
+        messages = connection.send_messages.call_args.args[0]
+        self.assertEqual(
+            [message.to for message in messages],
+            [[self.user1.email], [self.user2.email]],
+        )
+        html_content = messages[0].alternatives[0][0]
+        self.assertIn("Total time logged: 120 minutes", html_content)
+        self.assertIn(self.task1.title, html_content)
+
     def test_send_weekly_report_no_time_logs_last_week(self):
         # Create time logs that are older than one week
         now = timezone.now()
@@ -500,6 +1238,33 @@ class TaskAttachmentsTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
 
+    def test_list_attachments_caches_download_urls(self):
+        """Test that download URLs are signed once per object and window"""
+        for name in ["first.txt", "second.txt"]:
+            Attachment.objects.create(
+                task=self.task, user=self.user, file=f"task_1/{name}", status="Uploaded"
+            )
+        caches["presigned_urls"].clear()
+        storage = Attachment._meta.get_field("file").storage
+        client = storage.client
+        url = reverse("tasks-attachments", kwargs={"pk": self.task.pk})
+
+        with patch.object(
+            client, "presigned_get_object", wraps=client.presigned_get_object
+        ) as mock_presign:
+            first_response = self.client.get(url)
+            second_response = self.client.get(url)
+            self.assertEqual(mock_presign.call_count, 2)
+
+            # The next window signs new URLs
+            next_window = time.time() + settings.PRESIGNED_URL_CACHE_WINDOW
+            with patch("apps.common.storage.time.time", return_value=next_window):
+                self.client.get(url)
+            self.assertEqual(mock_presign.call_count, 4)
+
+        self.assertEqual(first_response.data, second_response.data)
+        self.assertIn("X-Amz-Signature", first_response.data[0]["file"])
+
     def test_patch_attachment(self):
         """Test updating an attachment's name"""
         attachment = Attachment.objects.create(
@@ -533,22 +1298,55 @@ class TaskAttachmentsTests(APITestCase):
         self.assertEqual(attachment.status, "Pending Upload")
         self.assertIsNotNone(attachment.file)
 
+    def test_generate_upload_urls(self):
+        """Test generating upload URLs for several attachments at once"""
+        url = reverse("tasks-generate-attachment-urls", kwargs={"pk": self.task.pk})
+        data = [{"name": f"file_{i}.txt"} for i in range(3)]
+
+        # Reserving the ids and a single insert, after loading the task
+        with self.assertNumQueries(3) as queries:
+            response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 3)
+        self.assertNotIn('"tasks_task"."description"', queries[0]["sql"])
+
+        for item in response.data:
+            attachment = Attachment.objects.get(pk=item["id"])
+            self.assertEqual(attachment.task, self.task)
+            self.assertEqual(attachment.user, self.user)
+            self.assertEqual(attachment.status, "Pending Upload")
+            self.assertEqual(
+                attachment.file.name, f"task_{self.task.pk}/{item['id']}_{item['name']}"
+            )
+            self.assertIn(attachment.file.name, item["url"])
+
+    def test_generate_upload_urls_limit(self):
+        """Test that the number of files per request is limited"""
+        url = reverse("tasks-generate-attachment-urls", kwargs={"pk": self.task.pk})
+        data = [{"name": f"file_{i}.txt"} for i in range(501)]
+
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Attachment.objects.exists())
+
     def test_webhook_listener_updates_attachment_status(self):
         """Test webhook listener for updating attachment status on S3 event."""
         attachment = Attachment.objects.create(
             task=self.task,
             user=self.user,
-            file="media/task_1/2_example_file.txt",
             status="Pending Upload",
         )
+        object_name = Attachment.custom_file_name(attachment, "example_file.txt")
+        attachment.file = object_name
+        attachment.save()
         payload = {
             "EventName": "s3:ObjectCreated:Put",
-            "Key": "media/task_1/2_example_file.txt",
+            "Key": f"media/{object_name}",
             "Records": [
                 {
                     "s3": {
                         "object": {
-                            "key": "task_1/2_example_file.txt",
+                            "key": object_name,
                             "size": 1024,
                         }
                     }
@@ -557,9 +1355,11 @@ class TaskAttachmentsTests(APITestCase):
         }
 
         url = reverse("webhook-listener")
-        response = self.client.post(
-            url, data=json.dumps(payload), content_type="application/json"
-        )
+        # A single UPDATE by primary key
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                url, data=json.dumps(payload), content_type="application/json"
+            )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         # Verify that the attachment status was updated
@@ -642,7 +1442,302 @@ class TaskAttachmentsTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 0)
 
+    def test_attachment_report_date_filter(self):
+        """Test filtering the attachment report by day"""
+        now = timezone.now()
+        for days_ago in [0, 2, 5]:
+            Attachment.objects.create(
+                task=self.task,
+                file=f"task_1/file_{days_ago}.txt",
+                status="Uploaded",
+                size=1024,
+                created_at=now - timedelta(days=days_ago),
+            )
+        url = reverse("attachments-reports")
+        date_from = timezone.localdate(now - timedelta(days=3)).isoformat()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {"date_from": date_from})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row["day"] for row in response.data["results"]],
+            [
+                timezone.localdate(now - timedelta(days=2)).isoformat(),
+                timezone.localdate(now).isoformat(),
+            ],
+        )
+        self.assertEqual(
+            response.data["results"][0],
+            {
+                "day": timezone.localdate(now - timedelta(days=2)).isoformat(),
+                "total_files": 1,
+                "total_size": 1024,
+                "total_volume_kb": 1,
+            },
+        )
+
+    def test_attachment_rollup_maintained(self):
+        """Test the storage rollup follows uploads, replays and deletions"""
+        attachment = Attachment.objects.create(task=self.task, name="report.pdf")
+        attachment.file = Attachment.custom_file_name(attachment, "report.pdf")
+        attachment.save()
+        day = timezone.localdate(attachment.created_at)
+        self.assertFalse(AttachmentDailyRollup.objects.exists())
+
+        def assert_rollup(files, total_size):
+            rollup = AttachmentDailyRollup.objects.get(day=day)
+            self.assertEqual((rollup.files, rollup.total_size), (files, total_size))
+
+        Attachment.mark_uploaded([(attachment.file.name, 2048)])
+        assert_rollup(1, 2048)
+
+        # A replay changes nothing, a new size only the total size
+        Attachment.mark_uploaded([(attachment.file.name, 2048)])
+        assert_rollup(1, 2048)
+        Attachment.mark_uploaded([(attachment.file.name, 4096)])
+        assert_rollup(1, 4096)
+
+        Attachment.objects.get(pk=attachment.pk).delete()
+        assert_rollup(0, 0)
+
+    def test_rebuild_attachment_rollup(self):
+        """Test rebuilding the storage rollup from the attachments"""
+        for size in [1024, 2048]:
+            Attachment.objects.create(
+                task=self.task, file="task_1/file.txt", status="Uploaded", size=size
+            )
+        AttachmentDailyRollup.objects.all().delete()
+
+        call_command("rebuild_attachment_rollup", stdout=StringIO())
+
+        rollup = AttachmentDailyRollup.objects.get()
+        self.assertEqual(rollup.day, timezone.localdate())
+        self.assertEqual((rollup.files, rollup.total_size), (2, 3072))
+
+
+class WebhookListenerTests(APITestCase):
+    fixtures = ["users", "tasks"]
+
+    def setUp(self):
+        self.attachment = Attachment.objects.create(task_id=1, name="report.pdf")
+        self.object_name = Attachment.custom_file_name(self.attachment, "report.pdf")
+        self.attachment.file = self.object_name
+        self.attachment.save()
+        self.url = reverse("webhook-listener")
+
+    def _payload(self, *object_names, size=2048):
+        return {
+            "EventName": "s3:ObjectCreated:Put",
+            "Key": f"media/{object_names[0]}",
+            "Records": [
+                {
+                    "eventName": "s3:ObjectCreated:Put",
+                    "s3": {"object": {"key": object_name, "size": size}},
+                }
+                for object_name in object_names
+            ],
+        }
+
+    def test_upload_event_unknown_object(self):
+        """Test that keys not matching an attachment are rejected"""
+        for object_name in [
+            "unrelated.txt",
+            f"task_2/{self.attachment.pk}_report.pdf",
+            f"task_1/{self.attachment.pk}_other.pdf",
+        ]:
+            response = self.client.post(
+                self.url, self._payload(object_name), format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.attachment.refresh_from_db()
+        self.assertEqual(self.attachment.status, "Pending Upload")
+
+    def test_upload_events_batch(self):
+        """Test that every record of a notification is applied in one query"""
+        other = Attachment.objects.create(task_id=2, name="notes 1.txt")
+        other.file = Attachment.custom_file_name(other, "notes 1.txt")
+        other.save()
+
+        # Record keys are URL encoded
+        payload = self._payload(self.object_name, other.file.name.replace(" ", "+"))
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for attachment in [self.attachment, other]:
+            attachment.refresh_from_db()
+            self.assertEqual(attachment.status, "Uploaded")
+            self.assertEqual(attachment.size, 2048)
+
+    def test_upload_events_replay(self):
+        """Test that a replayed notification leaves the attachment unchanged"""
+        payload = self._payload(self.object_name, size=4096)
+        for _ in range(2):
+            response = self.client.post(self.url, payload, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.attachment.refresh_from_db()
+        self.assertEqual(self.attachment.status, "Uploaded")
+        self.assertEqual(self.attachment.size, 4096)
+
+    @override_settings(MINIO_WEBHOOK_ASYNC=True)
+    @patch("apps.tasks.views.mark_attachments_uploaded.delay")
+    def test_upload_events_queued(self, mock_delay):
+        """Test that upload events are queued to Celery when enabled"""
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                self.url, self._payload(self.object_name), format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        mock_delay.assert_called_once_with([[self.object_name, 2048]])
+
+    def test_parse_object_name(self):
+        """Test reading the task and attachment ids from an object name"""
+        self.assertEqual(
+            Attachment.parse_object_name(self.object_name), (1, self.attachment.pk)
+        )
+        self.assertIsNone(Attachment.parse_object_name("task_1/report.pdf"))
+
+
+class MultipartUploadTests(APITestCase):
+    fixtures = ["users", "tasks"]
+
+    def setUp(self):
+        self.user = User.objects.get(pk=1)
+        self.task = Task.objects.get(pk=1)
+        self.client.force_authenticate(user=self.user)
+
+    def _create_upload(self, parts_count=2):
+        attachment = Attachment.objects.create(
+            task=self.task,
+            user=self.user,
+            name="video.mp4",
+            upload_id="upload-1",
+            part_size=64 * 1024 * 1024,
+            parts_count=parts_count,
+        )
+        attachment.file = Attachment.custom_file_name(attachment, attachment.name)
+        attachment.save()
+        return attachment
+
+    def _url(self, name, attachment):
+        return reverse(
+            name, kwargs={"pk": self.task.pk, "attachment_id": attachment.pk}
+        )
+
+    @patch("apps.tasks.multipart.default_storage.client._create_multipart_upload")
+    def test_create_multipart_upload(self, mock_create):
+        """Test starting a multipart upload with presigned URLs for every part"""
+        mock_create.return_value = "upload-1"
+        url = reverse("tasks-attachments-multipart", kwargs={"pk": self.task.pk})
+        data = {"name": "video.mp4", "size": 200 * 1024 * 1024}
+
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["upload_id"], "upload-1")
+        self.assertEqual(response.data["part_size"], 64 * 1024 * 1024)
+        self.assertEqual(response.data["parts_count"], 4)
+        self.assertEqual(list(response.data["urls"]), [1, 2, 3, 4])
+        self.assertIn("uploadId=upload-1", response.data["urls"][1])
 
+        attachment = Attachment.objects.get(pk=response.data["id"])
+        self.assertEqual(attachment.status, "Pending Upload")
+        self.assertEqual(attachment.user, self.user)
+        self.assertIsNone(attachment.size)
+        mock_create.assert_called_once_with("media", attachment.file.name, {})
+
+    def test_record_multipart_parts(self):
+        """Test that reported parts are tracked and no longer get URLs"""
+        attachment = self._create_upload(parts_count=3)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self._url("tasks-attachments-multipart-parts", attachment),
+                [{"part_number": 2, "etag": "etag-2"}],
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Only the task id and executor are loaded
+        for query in queries:
+            self.assertNotIn('"tasks_task"."description"', query["sql"])
+        self.assertEqual(response.data["uploaded_parts"], {"2": "etag-2"})
+
+        response = self.client.get(
+            self._url("tasks-attachments-multipart-detail", attachment)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["missing_parts"], [1, 3])
+        self.assertEqual(list(response.data["urls"]), [1, 3])
+
+    def test_record_multipart_parts_out_of_range(self):
+        """Test that part numbers beyond the upload are rejected"""
+        attachment = self._create_upload(parts_count=2)
+
+        response = self.client.post(
+            self._url("tasks-attachments-multipart-parts", attachment),
+            [{"part_number": 3, "etag": "etag-3"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.uploaded_parts, {})
+
+    @patch("apps.tasks.multipart.default_storage.client._complete_multipart_upload")
+    def test_complete_multipart_upload(self, mock_complete):
+        """Test completing an upload once every part is reported"""
+        attachment = self._create_upload(parts_count=2)
+        attachment.uploaded_parts = {"1": "etag-1"}
+        attachment.save()
+
+        response = self.client.post(
+            self._url("tasks-attachments-multipart-complete", attachment),
+            [{"part_number": 2, "etag": "etag-2"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        bucket_name, object_name, upload_id, parts = mock_complete.call_args.args
+        self.assertEqual(object_name, attachment.file.name)
+        self.assertEqual(upload_id, "upload-1")
+        self.assertEqual(
+            [(part.part_number, part.etag) for part in parts],
+            [(1, "etag-1"), (2, "etag-2")],
+        )
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.upload_id, "")
+
+    @patch("apps.tasks.multipart.default_storage.client._complete_multipart_upload")
+    def test_complete_multipart_upload_missing_parts(self, mock_complete):
+        """Test that an upload with missing parts cannot be completed"""
+        attachment = self._create_upload(parts_count=2)
+
+        response = self.client.post(
+            self._url("tasks-attachments-multipart-complete", attachment),
+            [{"part_number": 1, "etag": "etag-1"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["missing_parts"], [2])
+        mock_complete.assert_not_called()
+        # The part sent along is kept
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.uploaded_parts, {"1": "etag-1"})
+
+    @patch("apps.tasks.multipart.default_storage.client._abort_multipart_upload")
+    def test_abort_multipart_upload(self, mock_abort):
+        """Test aborting an upload drops the attachment"""
+        attachment = self._create_upload()
+
+        response = self.client.delete(
+            self._url("tasks-attachments-multipart-detail", attachment)
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        mock_abort.assert_called_once_with("media", attachment.file.name, "upload-1")
+        self.assertFalse(Attachment.objects.filter(pk=attachment.pk).exists())
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
 class TaskSearchTests(APITestCase):
     fixtures = ["users", "tasks", "comments"]
 
@@ -650,6 +1745,11 @@ class TaskSearchTests(APITestCase):
         self.user = User.objects.get(pk=1)
         self.task = Task.objects.get(pk=1)
         self.client.force_authenticate(user=self.user)
+        # Documents are indexed after commit, which never happens in a test case
+        for model in [Task, Comment]:
+            index_documents(
+                model._meta.label, list(model.objects.values_list("pk", flat=True))
+            )
 
     def test_search_existing_tasks(self):
         """Test searching for existing tasks"""
@@ -663,12 +1763,13 @@ class TaskSearchTests(APITestCase):
 
     def test_search_newly_created_task(self):
         """Test searching for newly created tasks"""
-        Task.objects.create(
-            title="New Task",
-            description="New task description",
-            owner=self.user,
-            executor=self.user,
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(
+                title="New Task",
+                description="New task description",
+                owner=self.user,
+                executor=self.user,
+            )
         url = reverse("search-tasks")
         response = self.client.get(url, {"search": "New Task"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -685,7 +1786,8 @@ class TaskSearchTests(APITestCase):
 
     def test_search_newly_created_comment(self):
         """Test searching for newly created comments"""
-        Comment.objects.create(task=self.task, text="New Comment", user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(task=self.task, text="New Comment", user=self.user)
         url = reverse("search-comments")
         response = self.client.get(url, {"search": "New Comment"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -693,6 +1795,399 @@ class TaskSearchTests(APITestCase):
         self.assertEqual(response.data["results"][0]["text"], "New Comment")
 
 
+class SearchPaginationTests(APITestCase):
+    fixtures = ["users", "tasks"]
+
+    def setUp(self):
+        self.user = User.objects.get(pk=1)
+        self.client.force_authenticate(user=self.user)
+        self.searches = []
+        patcher = patch.object(
+            Search, "execute", autospec=True, side_effect=self._execute
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _execute(self, search):
+        """Answer with tasks 2 and 1 in this order, out of 420 hits"""
+        self.searches.append(search.to_dict())
+        hits = [
+            {
+                "_id": str(pk),
+                "_score": score,
+                "_source": {"id": pk, "title": f"Task {pk}", "status": "open"},
+                "highlight": {"title": [f"<em>Task</em> {pk}"]},
+                "sort": [score, pk],
+            }
+            for pk, score in [(2, 3.5), (1, 1.2)]
+        ]
+        return Response(search, {"hits": {"total": {"value": 420}, "hits": hits}})
+
+    def test_search_paginated_by_elasticsearch(self):
+        """Test the page is fetched from Elasticsearch by relevance"""
+        url = reverse("search-tasks")
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"search": "API", "page": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 420)
+        self.assertEqual([task["id"] for task in response.data["results"]], [2, 1])
+
+        body = self.searches[0]
+        self.assertEqual(body["from"], 100)
+        self.assertEqual(body["size"], 100)
+        self.assertEqual(body["sort"], ["_score", {"id": "asc"}])
+        self.assertTrue(body["track_total_hits"])
+
+    def test_search_skips_deleted_rows(self):
+        """Test hits whose row is gone are left out of the page"""
+        Task.objects.filter(pk=1).delete()
+        response = self.client.get(reverse("search-tasks"), {"search": "API"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([task["id"] for task in response.data["results"]], [2])
+
+    def test_search_past_result_window(self):
+        """Test pages past the Elasticsearch result window are refused"""
+        response = self.client.get(reverse("search-tasks"), {"page": 101})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.searches, [])
+
+    def test_search_after_cursor(self):
+        """Test cursor pagination follows the sort values of the last hit"""
+        url = reverse("search-tasks")
+        with patch.object(SearchAfterPagination, "page_size", 2):
+            response = self.client.get(url, {"search": "API", "pagination": "cursor"})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["count"], 420)
+            self.assertNotIn("search_after", self.searches[0])
+
+            response = self.client.get(response.data["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.searches[1]["search_after"], [1.2, 1])
+        self.assertEqual(self.searches[1]["size"], 2)
+
+    def test_search_light_view(self):
+        """Test light results are served from the index without the database"""
+        url = reverse("search-tasks")
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"search": "Task", "view": "light"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 420)
+        self.assertEqual(
+            response.data["results"][0],
+            {
+                "id": 2,
+                "title": "Task 2",
+                "status": "open",
+                "executor": None,
+                "highlight": {"title": ["<em>Task</em> 2"]},
+            },
+        )
+
+        body = self.searches[0]
+        self.assertEqual(body["_source"], ["id", "title", "status", "executor"])
+        self.assertEqual(set(body["highlight"]["fields"]), {"title", "description"})
+
+    def test_search_invalid_cursor(self):
+        """Test an invalid cursor is refused"""
+        response = self.client.get(reverse("search-tasks"), {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=True, CELERY_TASK_ALWAYS_EAGER=True)
+class SearchIndexingTests(APITestCase):
+    fixtures = ["users", "tasks"]
+
+    def setUp(self):
+        self.user = User.objects.get(pk=1)
+        self.client.force_authenticate(user=self.user)
+
+    @patch("apps.tasks.tasks.update_search_index.delay")
+    def test_changes_queued_after_commit(self, mock_delay):
+        """Test that changes are sent for indexing once per instance on commit"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            task = Task.objects.create(
+                title="Indexed", owner=self.user, executor=self.user
+            )
+            task.title = "Indexed twice"
+            task.save()
+            comment = Comment.objects.create(task=task, user=self.user, text="Hi")
+            mock_delay.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        mock_delay.assert_has_calls(
+            [call("tasks.Task", [task.pk]), call("tasks.Comment", [comment.pk])],
+            any_order=True,
+        )
+        self.assertEqual(mock_delay.call_count, 2)
+
+    @patch("apps.tasks.tasks.update_search_index.delay")
+    def test_bulk_changes_queued_once(self, mock_delay):
+        """Test tasks created or updated in bulk are indexed in one batch"""
+        url = reverse("tasks-bulk")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                url, [{"title": "A"}, {"title": "B"}], format="json"
+            )
+        created_ids = [task["id"] for task in response.data]
+        mock_delay.assert_called_once_with("tasks.Task", created_ids)
+
+        mock_delay.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                url,
+                [{"id": pk, "status": "completed"} for pk in [1, 2]],
+                format="json",
+            )
+        mock_delay.assert_called_once_with("tasks.Task", [1, 2])
+
+    def test_pending_documents_callback_layout(self):
+        """Test the batch is found in the on_commit callbacks Django keeps"""
+        connection = transaction.get_connection()
+        with self.captureOnCommitCallbacks():
+            queue_documents(Task, [1])
+            queue_documents(Task, [2])
+            # Fails when Django changes the layout, which would stop the batching
+            savepoint_ids, pending, robust = connection.run_on_commit[-1]
+            self.assertIsInstance(pending, PendingDocuments)
+            self.assertEqual(savepoint_ids, set(connection.savepoint_ids))
+            self.assertIs(get_pending_documents(connection), pending)
+            self.assertEqual(pending.pks, {"tasks.Task": {1, 2}})
+
+            with transaction.atomic():
+                self.assertIsNone(get_pending_documents(connection))
+
+    @patch("apps.tasks.tasks.update_search_index.delay")
+    def test_unknown_callback_layout_starts_new_batch(self, mock_delay):
+        """Test an unknown on_commit layout still queues the changes"""
+        connection = transaction.get_connection()
+        run_on_commit = [object()]
+        with patch.object(connection, "run_on_commit", run_on_commit):
+            self.assertIsNone(get_pending_documents(connection))
+            queue_documents(Task, [1])
+
+        run_on_commit[-1][1]()
+        mock_delay.assert_called_once_with("tasks.Task", [1])
+
+    @patch("django_elasticsearch_dsl.documents.bulk")
+    def test_index_documents(self, mock_bulk):
+        """Test indexing existing instances and removing deleted ones in one bulk"""
+        index_documents("tasks.Task", [1, 999])
+
+        actions = mock_bulk.call_args.kwargs["actions"]
+        self.assertEqual(
+            [(action["_op_type"], action["_id"]) for action in actions],
+            [("index", 1), ("delete", 999)],
+        )
+        self.assertEqual(actions[0]["_source"]["title"], Task.objects.get(pk=1).title)
+
+    @patch("django_elasticsearch_dsl.documents.bulk")
+    def test_index_documents_during_reindex(self, mock_bulk):
+        """Test changes are also written to the index being rebuilt"""
+        set_reindex_target("tasks", "tasks-new")
+        self.addCleanup(set_reindex_target, "tasks", None)
+        index_documents("tasks.Task", [1])
+
+        actions = mock_bulk.call_args.kwargs["actions"]
+        self.assertEqual(
+            [(action["_index"], action["_id"]) for action in actions],
+            [("tasks", 1), ("tasks-new", 1)],
+        )
+
+    @patch("django_elasticsearch_dsl.documents.bulk")
+    def test_writes_succeed_with_elasticsearch_down(self, mock_bulk):
+        """Test that API writes do not fail when Elasticsearch is unreachable"""
+        mock_bulk.side_effect = elasticsearch.ConnectionError("Connection refused")
+        url = reverse("tasks-list")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {"title": "Offline"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Task.objects.filter(title="Offline").exists())
+        mock_bulk.assert_called()
+
+
+@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=True, CELERY_TASK_ALWAYS_EAGER=True)
+class SearchIndexingAutocommitTests(APITransactionTestCase):
+    fixtures = ["users", "tasks"]
+
+    def setUp(self):
+        self.user = User.objects.get(pk=1)
+        self.client.force_authenticate(user=self.user)
+
+    @patch("apps.tasks.tasks.update_search_index.delay")
+    def test_changes_queued_in_autocommit(self, mock_delay):
+        """Test that writes outside a transaction are still sent for indexing"""
+        response = self.client.post(
+            reverse("tasks-list"), {"title": "Autocommit"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_delay.assert_any_call("tasks.Task", [response.data["id"]])
+
+
+class ReindexSearchTests(APITestCase):
+    fixtures = ["users", "tasks"]
+
+    def setUp(self):
+        self.client_mock = Mock()
+        self.client_mock.indices.exists_alias.return_value = True
+        self.client_mock.indices.get_alias.return_value = {"tasks-old": {}}
+        patcher = patch(
+            "django_elasticsearch_dsl.documents.Document._get_connection",
+            return_value=self.client_mock,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.actions = []
+
+    def _parallel_bulk(self, client, actions, **kwargs):
+        for action in actions:
+            self.actions.append(action)
+            status_code = 409 if action["_id"] == 2 else 201
+            yield status_code == 201, {"create": {"status": status_code}}
+
+    def test_reindex_switches_alias(self):
+        """Test documents are loaded into a new index put behind the alias"""
+        out = StringIO()
+        with patch(
+            "apps.tasks.management.commands.reindex_search.parallel_bulk",
+            side_effect=self._parallel_bulk,
+        ) as mock_bulk:
+            call_command(
+                "reindex_search", "--index", "tasks", "--thread-count", "2", stdout=out
+            )
+
+        indices = self.client_mock.indices
+        index_name = indices.create.call_args.kwargs["index"]
+        self.assertTrue(index_name.startswith("tasks-"))
+        self.assertEqual(
+            indices.create.call_args.kwargs["mappings"]["properties"]["status"],
+            {"type": "keyword"},
+        )
+        self.assertEqual(mock_bulk.call_args.kwargs["thread_count"], 2)
+        self.assertEqual(
+            [(action["_op_type"], action["_index"]) for action in self.actions],
+            [("create", index_name)] * Task.objects.count(),
+        )
+
+        # Refresh and replicas are off during the load and restored before the switch
+        self.assertEqual(
+            indices.put_settings.call_args_list,
+            [
+                call(
+                    index=index_name,
+                    settings={"refresh_interval": "-1", "number_of_replicas": 0},
+                ),
+                call(
+                    index=index_name,
+                    settings={"refresh_interval": None, "number_of_replicas": 0},
+                ),
+            ],
+        )
+        indices.refresh.assert_called_once_with(index=index_name)
+        indices.update_aliases.assert_called_once_with(
+            actions=[
+                {"remove": {"index": "tasks-old", "alias": "tasks"}},
+                {"add": {"index": index_name, "alias": "tasks"}},
+            ]
+        )
+        indices.delete.assert_called_once_with(index="tasks-old")
+        self.assertIsNone(get_reindex_target("tasks"))
+        self.assertIn(
+            f"Successfully indexed 2 documents into {index_name}", out.getvalue()
+        )
+
+    def test_reindex_replaces_concrete_index(self):
+        """Test an index created without an alias is replaced by the alias"""
+        self.client_mock.indices.exists_alias.return_value = False
+        self.client_mock.indices.exists.return_value = True
+        with patch(
+            "apps.tasks.management.commands.reindex_search.parallel_bulk",
+            side_effect=self._parallel_bulk,
+        ):
+            call_command("reindex_search", "--index", "tasks", stdout=StringIO())
+
+        index_name = self.client_mock.indices.create.call_args.kwargs["index"]
+        self.client_mock.indices.update_aliases.assert_called_once_with(
+            actions=[
+                {"remove_index": {"index": "tasks"}},
+                {"add": {"index": index_name, "alias": "tasks"}},
+            ]
+        )
+        self.client_mock.indices.delete.assert_not_called()
+
+    def test_reindex_removes_rows_deleted_during_load(self):
+        """Test a row deleted while the load runs is removed from the new index"""
+
+        def parallel_bulk(client, actions, **kwargs):
+            actions = iter(actions)
+            yield from self._parallel_bulk(client, [next(actions)], **kwargs)
+            # The indexing task deleted its document before the load created it
+            Task.objects.filter(pk=2).delete()
+            yield from self._parallel_bulk(client, actions, **kwargs)
+
+        out = StringIO()
+        with (
+            patch(
+                "apps.tasks.management.commands.reindex_search.parallel_bulk",
+                side_effect=parallel_bulk,
+            ),
+            patch("apps.tasks.management.commands.reindex_search.bulk") as mock_bulk,
+        ):
+            call_command("reindex_search", "--index", "tasks", stdout=out)
+
+        index_name = self.client_mock.indices.create.call_args.kwargs["index"]
+        self.assertEqual(
+            list(mock_bulk.call_args.args[1]),
+            [{"_op_type": "delete", "_index": index_name, "_id": 2}],
+        )
+        self.assertEqual(mock_bulk.call_args.kwargs["ignore_status"], (404,))
+        self.client_mock.indices.update_aliases.assert_called_once()
+        self.assertIn(
+            f"Successfully indexed 1 documents into {index_name}", out.getvalue()
+        )
+
+    def test_reindex_reads_rows_on_calling_thread(self):
+        """Test the bulk threads only send actions and open no connection"""
+        thread_connections = []
+
+        def parallel_bulk(client, actions, **kwargs):
+            def consume():
+                self.actions += list(actions)
+                thread_connections.append(connection.connection)
+
+            thread = threading.Thread(target=consume)
+            thread.start()
+            thread.join()
+            return [(True, {"create": {"status": 201}})] * len(self.actions)
+
+        with patch(
+            "apps.tasks.management.commands.reindex_search.parallel_bulk",
+            side_effect=parallel_bulk,
+        ):
+            call_command("reindex_search", "--index", "tasks", stdout=StringIO())
+
+        self.assertEqual(len(self.actions), Task.objects.count())
+        self.assertEqual(thread_connections, [None])
+
+    def test_reindex_failure_drops_new_index(self):
+        """Test a failed load removes the new index and keeps the alias"""
+        with patch(
+            "apps.tasks.management.commands.reindex_search.parallel_bulk",
+            return_value=[(False, {"create": {"status": 400, "error": "bad"}})],
+        ):
+            with self.assertRaises(CommandError):
+                call_command("reindex_search", "--index", "tasks", stdout=StringIO())
+
+        indices = self.client_mock.indices
+        index_name = indices.create.call_args.kwargs["index"]
+        indices.update_aliases.assert_not_called()
+        indices.delete.assert_called_once_with(
+            index=index_name, ignore_unavailable=True
+        )
+        self.assertIsNone(get_reindex_target("tasks"))
+
+
 class CleanPendingUploadsTaskTests(APITestCase):
     fixtures = ["users", "tasks"]
 
@@ -701,91 +2196,88 @@ class CleanPendingUploadsTaskTests(APITestCase):
         self.user = User.objects.get(pk=1)
 
     @patch("apps.tasks.tasks.default_storage.client.stat_object")
-    @patch("apps.tasks.tasks.default_storage.client.remove_object")
-    def test_process_existing_attachment(self, mock_remove, mock_stat):
-        """Test processing an existing attachment with a valid size."""
-        attachment = Attachment.objects.create(
+    @patch("apps.tasks.tasks.default_storage.client.remove_objects")
+    def test_clean_pending_uploads(self, mock_remove_objects, mock_stat):
+        """Test cleaning pending uploads older than threshold time."""
+        created_at = timezone.now() - timedelta(days=2)
+        uploaded, missing, empty = [
+            Attachment.objects.create(
+                task=self.task,
+                user=self.user,
+                file=f"media/task_1/{name}.txt",
+                status="Pending Upload",
+                created_at=created_at,
+            )
+            for name in ["uploaded_file", "missing_file", "empty_file"]
+        ]
+        # Too recent to be cleaned
+        recent = Attachment.objects.create(
             task=self.task,
             user=self.user,
-            file="media/task_1/valid_file.txt",
+            file="media/task_1/recent_file.txt",
             status="Pending Upload",
         )
-        mock_stat.return_value.size = 2048  # Mock the object size
 
-        was_deleted, was_updated = process_attachment(attachment)
-        attachment.refresh_from_db()
-        self.assertFalse(was_deleted)
-        self.assertTrue(was_updated)
-        self.assertEqual(attachment.status, "Uploaded")
-        mock_remove.assert_not_called()
-        mock_stat.assert_called_once()
+        def stat_object(bucket_name, object_name):
+            if object_name == missing.file.name:
+                raise S3Error(
+                    code="NoSuchKey",
+                    message="The specified key does not exist.",
+                    resource=object_name,
+                    request_id="dummy-request-id",
+                    host_id="dummy-host-id",
+                    response=HTTPResponse(),
+                )
+            stats = Mock()
+            stats.size = 0 if object_name == empty.file.name else 2048
+            return stats
+
+        mock_stat.side_effect = stat_object
+        mock_remove_objects.return_value = iter([])
+
+        # Reading the chunk, one update, and a delete loading the rows for
+        # delete signals
+        with self.assertNumQueries(4):
+            result = clean_pending_uploads()
+
+        self.assertEqual(result, "Pending: 3, Deleted: 2, Updated: 1")
+        self.assertEqual(mock_stat.call_count, 3)
+        removed_objects = mock_remove_objects.call_args.args[1]
+        self.assertEqual(
+            [removed_object.name for removed_object in removed_objects],
+            [empty.file.name],
+        )
+        uploaded.refresh_from_db()
+        self.assertEqual(uploaded.status, "Uploaded")
+        self.assertEqual(
+            list(Attachment.objects.values_list("id", flat=True).order_by("id")),
+            [uploaded.id, recent.id],
+        )
 
+    @patch("apps.tasks.multipart.default_storage.client._abort_multipart_upload")
     @patch("apps.tasks.tasks.default_storage.client.stat_object")
-    def test_process_missing_attachment(self, mock_stat):
-        """Test processing a missing attachment (object not found)."""
+    def test_clean_pending_uploads_aborts_multipart(self, mock_stat, mock_abort):
+        """Test that stale multipart uploads are aborted when cleaned"""
         attachment = Attachment.objects.create(
             task=self.task,
             user=self.user,
-            file="media/task_1/missing_file.txt",
-            status="Pending Upload",
+            file="task_1/1_video.mp4",
+            created_at=timezone.now() - timedelta(days=2),
+            upload_id="upload-1",
+            part_size=64 * 1024 * 1024,
+            parts_count=2,
         )
         mock_stat.side_effect = S3Error(
             code="NoSuchKey",
             message="The specified key does not exist.",
-            resource="media/task_1/missing_file.txt",
+            resource=attachment.file.name,
             request_id="dummy-request-id",
             host_id="dummy-host-id",
             response=HTTPResponse(),
         )
 
-        was_deleted, was_updated = process_attachment(attachment)
-        self.assertTrue(was_deleted)
-        self.assertFalse(was_updated)
-        self.assertFalse(Attachment.objects.filter(pk=attachment.pk).exists())
-
-    @patch("apps.tasks.tasks.default_storage.client.stat_object")
-    @patch("apps.tasks.tasks.default_storage.client.remove_object")
-    def test_process_zero_size_attachment(self, mock_remove, mock_stat):
-        """Test processing an attachment with a size of zero."""
-        attachment = Attachment.objects.create(
-            task=self.task,
-            user=self.user,
-            file="media/task_1/zero_size_file.txt",
-            status="Pending Upload",
-        )
-        mock_stat.return_value.size = 0  # Mock size 0
-
-        was_deleted, was_updated = process_attachment(attachment)
-        self.assertTrue(was_deleted)
-        self.assertFalse(was_updated)
-        self.assertFalse(Attachment.objects.filter(pk=attachment.pk).exists())
-        mock_remove.assert_called_once()
-
-    @patch("apps.tasks.tasks.process_attachment")
-    def test_clean_pending_uploads(self, mock_process):
-        """Test cleaning pending uploads older than threshold time."""
-        Attachment.objects.create(
-            task=self.task,
-            user=self.user,
-            file="media/task_1/old_file.txt",
-            status="Pending Upload",
-            created_at=timezone.now() - timedelta(days=2),
-            size=2048,
-        )
-
-        Attachment.objects.create(
-            task=self.task,
-            user=self.user,
-            file="media/task_1/recent_file.txt",
-            status="Pending Upload",
-            created_at=timezone.now() - timedelta(days=2),
-            size=1024,
-        )
-
-        mock_process.side_effect = [
-            (True, False),
-            (False, True),
-        ]
         result = clean_pending_uploads()
 
-        self.assertEqual(result, "Pending: 2, Deleted: 1, Updated: 1")
+        self.assertEqual(result, "Pending: 1, Deleted: 1, Updated: 0")
+        mock_abort.assert_called_once_with("media", "task_1/1_video.mp4", "upload-1")
+        self.assertFalse(Attachment.objects.exists())
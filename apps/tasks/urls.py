@@ -4,6 +4,7 @@ from rest_framework.routers import DefaultRouter
 from apps.tasks.views import (
     TaskViewSet,
     ReportViewSet,
+    ReportExportView,
     TaskSearchViewSet,
     CommentSearchViewSet,
     WebhookListenerView,
@@ -27,6 +28,11 @@ urlpatterns = [
         name="search-comments",
     ),
     path("tasks/reports", ReportViewSet.as_view({"get": "list"}), name="tasks-reports"),
+    path(
+        "tasks/reports/export",
+        ReportExportView.as_view({"get": "export"}),
+        name="tasks-reports-export",
+    ),
     path(
         "attachments/reports",
         AttachmentReportView.as_view({"get": "list"}),
@@ -1,29 +1,65 @@
+import csv
 import json
-import os
+import math
 from datetime import timedelta
+from urllib.parse import unquote_plus
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.storage import default_storage
-from django.db.models import Sum, F, ExpressionWrapper, DurationField, Count
-from django.db.models.functions import TruncDay
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import (
+    Sum,
+    F,
+    ExpressionWrapper,
+    DurationField,
+    Count,
+    Prefetch,
+    Window,
+)
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django_filters.rest_framework import DjangoFilterBackend
+from minio.error import S3Error
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from apps.common.helpers import Echo, WindowSum, reserve_ids
+from apps.common.pagination import (
+    CountedPageNumberPagination,
+    KeysetPaginationMixin,
+    SearchAfterPagination,
+    SearchPagination,
+)
+from apps.tasks.cache import get_report_cache_key
 from apps.tasks.documents import TaskDocument, CommentDocument
-from apps.tasks.filters import TaskFilter, TimeLogFilter
-from apps.tasks.models import Task, Comment, TimeLog, Attachment
+from apps.tasks.filters import (
+    AttachmentDailyRollupFilter,
+    TaskFilter,
+    TimeLogDailyRollupFilter,
+    TimeLogFilter,
+)
+from apps.tasks import multipart
+from apps.tasks.indexing import queue_documents
+from apps.tasks.models import (
+    Task,
+    Comment,
+    TimeLog,
+    Attachment,
+    AttachmentDailyRollup,
+    TimeLogDailyRollup,
+)
 from apps.tasks.serializers import (
     TaskSerializer,
     TaskDetailSerializer,
     TaskListSerializer,
     TaskUpdateSerializer,
+    TaskBulkUpdateSerializer,
     TaskCreateSerializer,
     CommentCreateSerializer,
     CommentListSerializer,
@@ -33,36 +69,109 @@ from apps.tasks.serializers import (
     TimeLogStopSerializer,
     ReportSerializer,
     AttachmentSerializer,
+    MultipartUploadSerializer,
+    MultipartPartSerializer,
     TaskDocumentSerializer,
     CommentDocumentSerializer,
+    TaskSearchResultSerializer,
+    CommentSearchResultSerializer,
     AttachmentReportSerializer,
+    TimeLogExportSerializer,
 )
+from apps.tasks.notifications import notify_comments, notify_task_changes
+from apps.tasks.tasks import mark_attachments_uploaded
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
-    queryset = (
-        Task.objects.all()
-        .order_by("id")
-        .prefetch_related("attachments", "comments", "time_logs")
-        .select_related("owner", "executor")
-    )
+    queryset = Task.objects.all().order_by("id")
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_class = TaskFilter
     search_fields = ["title"]
+    # Number of latest attachments, comments and time logs embedded in details
+    detail_nested_limit = 20
+    # Number of files accepted by the bulk upload URL endpoint
+    max_bulk_attachments = 500
+    # Number of comments accepted by the bulk comment import endpoint
+    max_bulk_comments = 1000
+    # Number of tasks accepted by the bulk create and update endpoints
+    max_bulk_tasks = 1000
+
+    def get_queryset(self):
+        """
+        Load only what the serializer of the current action needs
+        """
+        queryset = super().get_queryset()
+        if self.action == "list":
+            # Compute logged time for the whole page in the same query
+            return queryset.only("id", "title").with_logged_time()
+        elif self.action == "retrieve":
+            limit = self.detail_nested_limit
+            return (
+                queryset.select_related("owner", "executor")
+                .prefetch_related(
+                    Prefetch(
+                        "attachments",
+                        queryset=Attachment.objects.order_by("-created_at", "-id")[
+                            :limit
+                        ],
+                        to_attr="latest_attachments",
+                    ),
+                    Prefetch(
+                        "comments",
+                        queryset=Comment.objects.order_by("-created_at", "-id")[:limit],
+                        to_attr="latest_comments",
+                    ),
+                    Prefetch(
+                        "time_logs",
+                        queryset=TimeLog.objects.order_by("-start_time", "-id")[:limit],
+                        to_attr="latest_time_logs",
+                    ),
+                )
+                .with_logged_time()
+                .with_related_counts()
+            )
+        elif self.action == "partial_update":
+            return queryset.defer("description")
+        elif self.action == "bulk_update_tasks":
+            # What the changes are compared to and the response shows
+            return queryset.only("id", "title", "executor", "status")
+        elif self.action in [
+            "list_comment",
+            "create_comment",
+            "import_comments",
+            "list_logs",
+            "create_logs",
+            "start_timer",
+            "stop_timer",
+            "list_attachments",
+            "generate_attachment_url",
+            "generate_attachment_urls",
+            "create_multipart_upload",
+            "multipart_upload",
+            "abort_multipart_upload",
+            "record_multipart_parts",
+            "complete_multipart_upload",
+        ]:
+            # Nested resources only need the parent task, the comment
+            # notification also reads its executor
+            return queryset.only("id", "executor")
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
             return TaskListSerializer
         elif self.action == "retrieve":
             return TaskDetailSerializer
-        elif self.action == "create":
+        elif self.action in ["create", "bulk_create_tasks"]:
             return TaskCreateSerializer
         elif self.action == "partial_update":
             return TaskUpdateSerializer
+        elif self.action == "bulk_update_tasks":
+            return TaskBulkUpdateSerializer
         elif self.action == "list_comment":
             return CommentListSerializer
-        elif self.action == "create_comment":
+        elif self.action in ["create_comment", "import_comments"]:
             return CommentCreateSerializer
         elif self.action == "start_timer":
             return TimeLogStartSerializer
@@ -75,15 +184,90 @@ class TaskViewSet(viewsets.ModelViewSet):
         elif self.action in [
             "list_attachments",
             "generate_attachment_url",
+            "generate_attachment_urls",
             "update_attachment",
         ]:
             return AttachmentSerializer
+        elif self.action in [
+            "create_multipart_upload",
+            "multipart_upload",
+            "abort_multipart_upload",
+        ]:
+            return MultipartUploadSerializer
+        elif self.action in ["record_multipart_parts", "complete_multipart_upload"]:
+            return MultipartPartSerializer
         return TaskSerializer
 
+    def perform_create(self, serializer):
+        # The outbox rows written on save commit together with the task
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+    def get_keyset_ordering(self):
+        if self.action == "list_comment":
+            return ("created_at", "id")
+        return super().get_keyset_ordering()
+
+    @action(detail=False, methods=["post"], url_path="bulk", url_name="bulk")
+    def bulk_create_tasks(self, request):
+        serializer = self.get_serializer(
+            data=request.data, many=True, max_length=self.max_bulk_tasks
+        )
+        serializer.is_valid(raise_exception=True)
+
+        # bulk_create sends no post_save, notify and index the tasks at once
+        with transaction.atomic():
+            tasks = Task.objects.bulk_create(
+                Task(**item) for item in serializer.validated_data
+            )
+            notify_task_changes(tasks, created=True)
+            queue_documents(Task, [task.pk for task in tasks])
+        return Response(self.get_serializer(tasks, many=True).data, status=201)
+
+    @bulk_create_tasks.mapping.patch
+    def bulk_update_tasks(self, request):
+        serializer = self.get_serializer(
+            data=request.data, many=True, max_length=self.max_bulk_tasks
+        )
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data
+
+        ids = [item["id"] for item in items]
+        if len(set(ids)) < len(ids):
+            raise ValidationError({"id": ["Each task can only be updated once."]})
+        tasks = self.get_queryset().in_bulk(ids)
+        missing_ids = sorted(set(ids) - tasks.keys())
+        if missing_ids:
+            raise ValidationError({"id": [f"Tasks not found: {missing_ids}."]})
+
+        fields = set()
+        for item in items:
+            task = tasks[item.pop("id")]
+            self.check_object_permissions(request, task)
+            for field, value in item.items():
+                setattr(task, field, value)
+            fields.update(item)
+
+        tasks = [tasks[task_id] for task_id in ids]
+        # The update notifies the changes, they are indexed after commit
+        if fields:
+            with transaction.atomic():
+                Task.objects.bulk_update(tasks, sorted(fields))
+        return Response(TaskUpdateSerializer(tasks, many=True).data)
+
     @action(detail=True, url_path="comments", url_name="comments")
     def list_comment(self, request, pk=None):
         task = self.get_object()
         comments = Comment.objects.filter(task=task)
+        if self.keyset_requested():
+            page = self.paginate_queryset(comments)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
         serializer = self.get_serializer(comments, many=True)
         return Response(serializer.data)
 
@@ -94,13 +278,42 @@ class TaskViewSet(viewsets.ModelViewSet):
             data=request.data, context={"request": request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save(task=task)
+        # The notification written on save commits together with the comment
+        with transaction.atomic():
+            serializer.save(task=task)
         return Response(serializer.data, status=201)
 
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="comments/bulk",
+        url_name="comments-bulk",
+    )
+    def import_comments(self, request, pk=None):
+        task = self.get_object()
+        serializer = self.get_serializer(
+            data=request.data, many=True, max_length=self.max_bulk_comments
+        )
+        serializer.is_valid(raise_exception=True)
+
+        # bulk_create sends no post_save, notify and index the comments at once
+        with transaction.atomic():
+            comments = Comment.objects.bulk_create(
+                Comment(task=task, **item) for item in serializer.validated_data
+            )
+            notify_comments(comments)
+            queue_documents(Comment, [comment.pk for comment in comments])
+        return Response(self.get_serializer(comments, many=True).data, status=201)
+
     @action(detail=True, url_path="logs", url_name="logs")
     def list_logs(self, request, pk=None):
         task = self.get_object()
         logs = TimeLog.objects.filter(task=task)
+        if self.keyset_requested():
+            page = self.paginate_queryset(logs)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
         serializer = self.get_serializer(logs, many=True)
         return Response(serializer.data)
 
@@ -201,47 +414,213 @@ class TaskViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        instance = serializer.save(task=task)
-        object_name = Attachment.custom_file_name(instance, instance.name)
-        url = default_storage.client.presigned_put_object(
+        (instance,) = self._create_pending_attachments(
+            task, [serializer.validated_data]
+        )
+        return Response({"url": self._get_upload_url(instance)})
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="attachments/upload-urls",
+        url_name="generate-attachment-urls",
+    )
+    def generate_attachment_urls(self, request, pk=None):
+        task = self.get_object()
+        serializer = self.get_serializer(
+            data=request.data, many=True, max_length=self.max_bulk_attachments
+        )
+        serializer.is_valid(raise_exception=True)
+
+        attachments = self._create_pending_attachments(task, serializer.validated_data)
+        data = self.get_serializer(attachments, many=True).data
+        for item, attachment in zip(data, attachments):
+            item["url"] = self._get_upload_url(attachment)
+        return Response(data, status=201)
+
+    def _create_pending_attachments(self, task, items):
+        """
+        Insert the attachments with their object names in one query
+        """
+        return Attachment.objects.bulk_create(
+            self._build_pending_attachments(task, items)
+        )
+
+    def _build_pending_attachments(self, task, items):
+        """
+        Unsaved attachments with their object names, the ids the names are built
+        from are reserved beforehand
+        """
+        attachments = [Attachment(task=task, **item) for item in items]
+        ids = reserve_ids(Attachment, len(attachments))
+        for attachment, attachment_id in zip(attachments, ids):
+            attachment.id = attachment_id
+            attachment.file = Attachment.custom_file_name(attachment, attachment.name)
+        return attachments
+
+    def _get_upload_url(self, attachment):
+        # Signed locally, the client knows the region of the bucket
+        return default_storage.client.presigned_put_object(
             bucket_name=settings.MINIO_MEDIA_FILES_BUCKET,
-            object_name=object_name,
+            object_name=attachment.file.name,
             expires=timedelta(seconds=3600),
         )
 
-        instance.file = object_name
-        instance.save()
-        return Response({"url": url})
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="attachments/multipart",
+        url_name="attachments-multipart",
+    )
+    def create_multipart_upload(self, request, pk=None):
+        task = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        data = dict(serializer.validated_data)
+        size = data.pop("size")
+        (attachment,) = self._build_pending_attachments(task, [data])
+        attachment.upload_id = multipart.create_upload(attachment.file.name)
+        attachment.part_size = multipart.get_part_size(size)
+        attachment.parts_count = math.ceil(size / attachment.part_size)
+        attachment.save(force_insert=True)
+        return Response(self._get_multipart_data(attachment), status=201)
+
+    @action(
+        detail=True,
+        url_path="attachments/(?P<attachment_id>[^/.]+)/multipart",
+        url_name="attachments-multipart-detail",
+    )
+    def multipart_upload(self, request, pk=None, attachment_id=None):
+        attachment = self._get_multipart_attachment(attachment_id)
+        return Response(self._get_multipart_data(attachment))
+
+    @multipart_upload.mapping.delete
+    def abort_multipart_upload(self, request, pk=None, attachment_id=None):
+        attachment = self._get_multipart_attachment(attachment_id)
+        try:
+            multipart.abort_upload(attachment.file.name, attachment.upload_id)
+        except S3Error as exc:
+            if exc.code != "NoSuchUpload":
+                raise
+        attachment.delete()
+        return Response(status=204)
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="attachments/(?P<attachment_id>[^/.]+)/multipart/parts",
+        url_name="attachments-multipart-parts",
+    )
+    def record_multipart_parts(self, request, pk=None, attachment_id=None):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            attachment = self._get_multipart_attachment(attachment_id, lock=True)
+            self._add_uploaded_parts(attachment, serializer.validated_data)
+            attachment.save(update_fields=["uploaded_parts"])
+        return Response(MultipartUploadSerializer(attachment).data)
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="attachments/(?P<attachment_id>[^/.]+)/multipart/complete",
+        url_name="attachments-multipart-complete",
+    )
+    def complete_multipart_upload(self, request, pk=None, attachment_id=None):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            attachment = self._get_multipart_attachment(attachment_id, lock=True)
+            self._add_uploaded_parts(attachment, serializer.validated_data)
+            missing_parts = attachment.missing_parts
+            if missing_parts:
+                # Keep the parts sent along, only the missing ones are sent again
+                attachment.save(update_fields=["uploaded_parts"])
+                return Response(
+                    {"detail": "Missing parts", "missing_parts": missing_parts},
+                    status=400,
+                )
+
+            try:
+                multipart.complete_upload(
+                    attachment.file.name,
+                    attachment.upload_id,
+                    attachment.uploaded_parts,
+                )
+            except S3Error as exc:
+                return Response({"detail": exc.message}, status=400)
+
+            # The webhook marks the attachment as uploaded with its final size
+            attachment.upload_id = ""
+            attachment.uploaded_parts = {}
+            attachment.save(update_fields=["upload_id", "uploaded_parts"])
+        return Response(MultipartUploadSerializer(attachment).data)
+
+    def _get_multipart_attachment(self, attachment_id, lock=False):
+        task = self.get_object()
+        attachments = Attachment.objects.filter(task=task).exclude(upload_id="")
+        if lock:
+            attachments = attachments.select_for_update()
+        return get_object_or_404(attachments, id=attachment_id)
+
+    def _add_uploaded_parts(self, attachment, parts):
+        for part in parts:
+            if part["part_number"] > attachment.parts_count:
+                raise ValidationError(
+                    {"part_number": f"The upload has {attachment.parts_count} parts"}
+                )
+            attachment.uploaded_parts[str(part["part_number"])] = part["etag"]
+
+    def _get_multipart_data(self, attachment):
+        """
+        Upload state with presigned URLs for the parts still to upload
+        """
+        data = MultipartUploadSerializer(attachment).data
+        data["urls"] = {
+            part_number: multipart.presign_part(
+                attachment.file.name, attachment.upload_id, part_number
+            )
+            for part_number in attachment.missing_parts
+        }
+        return data
 
 
 class ReportViewSet(viewsets.GenericViewSet):
+    """
+    Time reports served from the daily rollup instead of the raw time logs
+    """
+
     permission_classes = [IsAuthenticated]
-    queryset = TimeLog.objects.all()
+    queryset = TimeLogDailyRollup.objects.all()
     filter_backends = [DjangoFilterBackend]
-    filterset_class = TimeLogFilter
+    filterset_class = TimeLogDailyRollupFilter
     serializer_class = ReportSerializer
+    pagination_class = CountedPageNumberPagination
 
-    def _get_tasks_with_duration(self, queryset, filterset):
+    def _get_tasks_with_duration(self, queryset):
         """
-        Aggregate total duration for each task and order them by it
+        Aggregate total duration for each task and order them by it, every row
+        also carries the grand total and the number of tasks
         """
-        tasks = (
+        return (
             queryset.values("task__id", "task__title")
             .annotate(
                 total_duration=Sum(
                     ExpressionWrapper(F("duration"), output_field=DurationField())
                 )
             )
-            .order_by("-total_duration")
+            .annotate(
+                total_logged_duration=Window(
+                    WindowSum(Sum("duration")), output_field=DurationField()
+                ),
+                tasks_count=Window(Count("*")),
+            )
+            .order_by("-total_duration", "task__id")
         )
 
-        # Apply top limit if specified in filter
-        top = getattr(filterset, "top", 0)
-        if top:
-            tasks = tasks[: int(top)]
-
-        return tasks
-
     def _format_task_data(self, tasks_with_time):
         """
         Format task data for serialization
@@ -255,17 +634,6 @@ class ReportViewSet(viewsets.GenericViewSet):
             for task in tasks_with_time
         ]
 
-    def _get_total_duration(self, queryset):
-        """
-        Calculate total duration from queryset
-        """
-        total = queryset.aggregate(
-            total_duration=Sum(
-                ExpressionWrapper(F("duration"), output_field=DurationField())
-            )
-        )["total_duration"]
-        return self._duration_to_minutes(total)
-
     @staticmethod
     def _duration_to_minutes(duration):
         """
@@ -275,7 +643,6 @@ class ReportViewSet(viewsets.GenericViewSet):
             return 0
         return duration.total_seconds() // 60
 
-    @method_decorator(cache_page(60))
     def list(self, request):
         # Apply filters
         filterset = self.filterset_class(
@@ -285,49 +652,195 @@ class ReportViewSet(viewsets.GenericViewSet):
         if not filterset.is_valid():
             return Response(filterset.errors, status=400)
 
+        # Serve the report from cache until time logs it reads are written
+        params = filterset.get_normalized_params()
+        params["page"] = request.query_params.get(self.paginator.page_query_param)
+        cache_key = get_report_cache_key(request.user.pk, params)
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            return Response(cached_data)
+
         queryset = filterset.qs
 
-        # Get tasks with their durations
-        tasks_with_time = self._get_tasks_with_duration(queryset, filterset)
+        # Fetch only the requested page, limited to the top tasks if specified
+        offset, limit = self.paginator.get_page_bounds(request)
+        top = int(getattr(filterset, "top", 0))
+        if top:
+            limit = min(limit, top)
+        tasks_with_time = (
+            list(self._get_tasks_with_duration(queryset)[offset:limit])
+            if offset < limit
+            else []
+        )
+
+        # Totals come with every row of the page
+        total_logged_time = 0
+        tasks_count = 0
+        if tasks_with_time:
+            total_logged_time = self._duration_to_minutes(
+                tasks_with_time[0]["total_logged_duration"]
+            )
+            tasks_count = tasks_with_time[0]["tasks_count"]
+            if top:
+                tasks_count = min(tasks_count, top)
+        self.paginator.set_count(tasks_count)
 
-        # Prepare response data
         tasks = self._format_task_data(tasks_with_time)
-        total_logged_time = self._get_total_duration(queryset)
+        response_data = {"total_logged_time": total_logged_time, "tasks": tasks}
+
+        response = self.get_paginated_response(response_data)
+        cache.set(cache_key, response.data, settings.REPORT_CACHE_TIMEOUT)
+        return response
+
+
+class ReportExportView(viewsets.GenericViewSet):
+    """
+    Stream the filtered time logs as CSV or NDJSON, rows are read with a server
+    side cursor so memory use does not depend on the number of rows
+    """
 
-        page = self.paginate_queryset(tasks)
-        response_data = {"total_logged_time": total_logged_time, "tasks": page}
+    permission_classes = [IsAuthenticated]
+    queryset = TimeLog.objects.all()
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = TimeLogFilter
+    serializer_class = TimeLogExportSerializer
+    pagination_class = None
+    chunk_size = 2000
+    export_formats = ["csv", "ndjson"]
+    # Not "format", which DRF reserves for choosing a renderer
+    format_query_param = "export_format"
+    fields = {
+        "id": "id",
+        "task": "task_id",
+        "task_title": "task__title",
+        "user": "user_id",
+        "user_email": "user__email",
+        "start_time": "start_time",
+        "end_time": "end_time",
+        "logged_time": "duration",
+        "note": "note",
+    }
+
+    def _get_rows(self, queryset):
+        rows = (
+            queryset.order_by("id")
+            .values_list(*self.fields.values())
+            .iterator(chunk_size=self.chunk_size)
+        )
+        for row in rows:
+            row = dict(zip(self.fields, row))
+            for field in ["start_time", "end_time"]:
+                if row[field] is not None:
+                    row[field] = row[field].isoformat()
+            if row["logged_time"] is not None:
+                row["logged_time"] = int(row["logged_time"].total_seconds() // 60)
+            yield row
+
+    def _stream_csv(self, rows):
+        writer = csv.DictWriter(Echo(), fieldnames=list(self.fields))
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow(row)
+
+    def _stream_ndjson(self, rows):
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+    def export(self, request):
+        export_format = request.query_params.get(self.format_query_param, "csv")
+        if export_format not in self.export_formats:
+            return Response(
+                {self.format_query_param: f"Choose one of {self.export_formats}"},
+                status=400,
+            )
 
-        return self.get_paginated_response(response_data)
+        filterset = self.filterset_class(request.GET, queryset=self.get_queryset())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=400)
+
+        rows = self._get_rows(filterset.qs)
+        if export_format == "csv":
+            response = StreamingHttpResponse(
+                self._stream_csv(rows), content_type="text/csv"
+            )
+        else:
+            response = StreamingHttpResponse(
+                self._stream_ndjson(rows), content_type="application/x-ndjson"
+            )
+        response["Content-Disposition"] = (
+            f'attachment; filename="time_logs.{export_format}"'
+        )
+        return response
 
 
-class BaseSearchViewSet(viewsets.GenericViewSet):
+class BaseSearchViewSet(KeysetPaginationMixin, viewsets.GenericViewSet):
     """
     Base viewset for Elasticsearch-based search functionality.
+
+    Elasticsearch paginates the hits by relevance, with ``from``/``size`` or with
+    ``search_after`` when keyset pagination is requested, and only the rows of
+    the current page are loaded from the database.
+
+    With ``?view=light`` the hits are served from the fields stored in the index
+    with their highlights, without querying the database.
     """
 
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter]
+    pagination_class = SearchPagination
     document_class = None  # Should be set by child classes
     search_fields = []
+    light_query_param = "view"
+    light_value = "light"
+    light_serializer_class = None  # Should be set by child classes
+    light_fields = []
 
-    def list(self, request):
-        query = request.query_params.get("search", "")
+    def light_requested(self):
+        return self.request.query_params.get(self.light_query_param) == self.light_value
+
+    def get_serializer_class(self):
+        if self.light_requested():
+            return self.light_serializer_class
+        return super().get_serializer_class()
 
-        # Create an Elasticsearch search object
+    def get_keyset_paginator(self):
+        return SearchAfterPagination()
+
+    def get_search(self):
+        query = self.request.query_params.get("search", "")
+        # The id breaks ties between equal scores so pages never overlap
         search = (
             self.document_class.search()
             .query("multi_match", query=query, fields=self.search_fields)
-            .extra(size=10000)
+            .sort("_score", {"id": "asc"})
         )
+        if self.light_requested():
+            return search.source(self.light_fields).highlight(*self.search_fields)
+        return search.source(False)
 
-        # Execute search and format results
-        response_queryset = search.to_queryset().order_by("id")
+    def list(self, request):
+        hits = self.paginator.paginate_search(self.get_search(), request)
 
-        # Paginate the queryset if needed
-        page = self.paginate_queryset(response_queryset)
+        if self.light_requested():
+            page = [self._get_light_result(hit) for hit in hits]
+        else:
+            page = self._get_instances(hits)
 
         serializer = self.get_serializer(page, many=True)
-        return self.get_paginated_response(serializer.data)
+        return self.paginator.get_paginated_response(serializer.data)
+
+    def _get_instances(self, hits):
+        """
+        Load the rows of the hits in one query, keeping the relevance order
+        """
+        instances = self.get_queryset().in_bulk([int(hit.meta.id) for hit in hits])
+        return [
+            instances[int(hit.meta.id)] for hit in hits if int(hit.meta.id) in instances
+        ]
+
+    def _get_light_result(self, hit):
+        highlight = hit.meta.highlight.to_dict() if "highlight" in hit.meta else {}
+        return {**hit.to_dict(), "highlight": highlight}
 
 
 class TaskSearchViewSet(BaseSearchViewSet):
@@ -337,7 +850,9 @@ class TaskSearchViewSet(BaseSearchViewSet):
 
     queryset = Task.objects.all()
     serializer_class = TaskDocumentSerializer
+    light_serializer_class = TaskSearchResultSerializer
     search_fields = ["title", "description"]
+    light_fields = ["id", "title", "status", "executor"]
     document_class = TaskDocument
 
 
@@ -348,7 +863,9 @@ class CommentSearchViewSet(BaseSearchViewSet):
 
     queryset = Comment.objects.all()
     serializer_class = CommentDocumentSerializer
+    light_serializer_class = CommentSearchResultSerializer
     search_fields = ["text"]
+    light_fields = ["id", "task", "text", "created_at"]
     document_class = CommentDocument
 
 
@@ -356,37 +873,53 @@ class WebhookListenerView(viewsets.GenericViewSet):
     permission_classes = []
     serializer_class = None
 
+    upload_events = {
+        "s3:ObjectCreated:Put",
+        "s3:ObjectCreated:Post",
+        "s3:ObjectCreated:Copy",
+        "s3:ObjectCreated:CompleteMultipartUpload",
+    }
+
+    def get_uploads(self, payload):
+        """
+        (object name, size) of every upload record of the notification
+        """
+        uploads = []
+        for record in payload.get("Records", []):
+            event_type = record.get("eventName", payload.get("EventName"))
+            if event_type in self.upload_events:
+                s3_object = record["s3"]["object"]
+                uploads.append([unquote_plus(s3_object["key"]), s3_object["size"]])
+        return uploads
+
     def listen(self, request):
         payload = json.loads(request.body)
-        event_type = payload["EventName"]
-        file_path = payload["Key"]
-        file_name = os.path.basename(file_path)
-        task_id = file_path.split("/")[1].split("_")[1]
-
-        if event_type == "s3:ObjectCreated:Put":
-            attachment = get_object_or_404(
-                Attachment, file__endswith=file_name, task_id=task_id
-            )
-            attachment.status = "Uploaded"
-            attachment.size = payload["Records"][0]["s3"]["object"]["size"]
-            attachment.save()
-            return Response({"detail": "Attachment status updated"}, status=200)
+        uploads = self.get_uploads(payload)
+        if not uploads:
+            return Response({"detail": "Unknown event type"}, status=400)
+
+        if settings.MINIO_WEBHOOK_ASYNC:
+            mark_attachments_uploaded.delay(uploads)
+            return Response({"detail": "Attachment updates queued"}, status=202)
 
-        return Response({"detail": "Unknown event type"}, status=400)
+        if not Attachment.mark_uploaded(uploads):
+            raise NotFound()
+        return Response({"detail": "Attachment status updated"}, status=200)
 
 
 class AttachmentReportView(viewsets.GenericViewSet):
+    """
+    Uploaded attachments per day, read from the daily storage rollup
+    """
+
     permission_classes = [IsAuthenticated]
-    queryset = Attachment.objects.all()
+    queryset = AttachmentDailyRollup.objects.filter(files__gt=0).order_by("day")
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AttachmentDailyRollupFilter
     serializer_class = AttachmentReportSerializer
 
     def list(self, request, *args, **kwargs):
-        report = (
-            Attachment.objects.filter(status="Uploaded")
-            .annotate(day=TruncDay("created_at"))
-            .values("day")
-            .annotate(total_volume_kb=Sum(F("size") / 1024), total_files=Count("id"))
-            .order_by("day")
-        )
-        page = self.paginate_queryset(report)
-        return self.get_paginated_response(page)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
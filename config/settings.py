@@ -136,9 +136,18 @@ CACHES = {
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         },
-    }
+    },
+    # Presigned URLs are deterministic, a per process cache avoids a round trip
+    "presigned_urls": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
 }
 
+# Cached reports are invalidated by time log writes, the timeout only bounds
+# how long unused entries are kept
+REPORT_CACHE_TIMEOUT = 60 * 60 * 6
+
 AUTH_USER_MODEL = "users.User"
 
 # Password validation
@@ -194,6 +203,14 @@ MINIO_ENDPOINT = f"{MINIO_HOST}:9000"
 MINIO_ACCESS_KEY = os.getenv("MINIO_ROOT_USER", "minio")
 MINIO_SECRET_KEY = os.getenv("MINIO_ROOT_PASSWORD", "minio123")
 MINIO_USE_HTTPS = False
+# With a known region presigned URLs are signed locally, without asking MinIO
+# for the bucket location
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
+MINIO_URL_EXPIRY_HOURS = timedelta(days=7)
+# Download URLs are signed once per window and cached, the window must be much
+# shorter than MINIO_URL_EXPIRY_HOURS
+PRESIGNED_URL_CACHE = "presigned_urls"
+PRESIGNED_URL_CACHE_WINDOW = 60 * 60
 
 MINIO_PUBLIC_BUCKETS = [
     "static",
@@ -205,6 +222,8 @@ MINIO_PRIVATE_BUCKETS = [
 MINIO_CONSISTENCY_CHECK_ON_START = True
 MINIO_NOTIFY_WEBHOOK_ENABLE_1 = "on"
 MINIO_NOTIFY_WEBHOOK_ENDPOINT_1 = f"http://{API_HOST}/minio/events"
+# Queue upload events to Celery instead of applying them in the webhook request
+MINIO_WEBHOOK_ASYNC = os.getenv("MINIO_WEBHOOK_ASYNC", "False") == "True"
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -224,6 +243,10 @@ EMAIL_HOST = MAILHOG_HOST
 EMAIL_PORT = 1025
 EMAIL_USE_TLS = False
 DEFAULT_FROM_EMAIL = "noreply@ebs-task-management.local"
+# Notifications of a recipient are collected for this long and sent as one email
+NOTIFICATION_DIGEST_WINDOW = timedelta(
+    minutes=int(os.getenv("NOTIFICATION_DIGEST_WINDOW_MINUTES", "5"))
+)
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
@@ -245,6 +268,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "apps.tasks.tasks.clean_pending_uploads",
         "schedule": crontab(hour="0", minute="0"),  # Daily at midnight
     },
+    "flush-notifications": {
+        "task": "apps.tasks.tasks.flush_notifications",
+        "schedule": crontab(minute="*"),  # Every minute
+    },
 }
 
 ELASTICSEARCH_DSL = {
@@ -252,6 +279,8 @@ ELASTICSEARCH_DSL = {
         "hosts": f"http://{ELASTIC_HOST}:9200",
     }
 }
+# Index changed documents from Celery after commit instead of inside requests
+ELASTICSEARCH_DSL_SIGNAL_PROCESSOR = "apps.tasks.indexing.QueuedSignalProcessor"
 
 SITE_ID = 1
 